@@ -1,11 +1,17 @@
 from flask import Flask
-from app.extensions import ma, limiter, cache
+from app.extensions import ma, limiter, cache, warn_process_local_limits
 from app.models import db
+from app.commands import register_commands
+from app.utils.caching import cache_config, warn_process_local_cache
+from app.utils.db_pool import configure_pool, apply_statement_timeout
+from app.utils.replica import init_replica
+from app.utils.instrumentation import init_instrumentation
 from app.blueprints.customers import customers_bp
 from app.blueprints.employees import employee_bp
 from app.blueprints.cars import cars_bp
 from app.blueprints.Service_Ticket import serviceTicket_bp
 from app.blueprints.service_type import serviceType_bp
+from app.blueprints.reports import reports_bp
 from flask_swagger_ui import get_swaggerui_blueprint
 from config import DevelopmentConfig, TestingConfig, ProductionConfig
 
@@ -26,14 +32,20 @@ config_map = {
     'ProductionConfig': ProductionConfig
 }
 
-def create_app(config_name):
+def create_app(config_name, **overrides):
     app = Flask(__name__)
     app.config.from_object(config_map[config_name])
+    app.config.update(overrides)
     
     ma.init_app(app)
+    configure_pool(app)
     db.init_app(app)
+    init_replica(app)
+    apply_statement_timeout(app)
     limiter.init_app(app)
-    cache.init_app(app)
+    warn_process_local_limits(app)
+    cache.init_app(app, config=cache_config(app))
+    warn_process_local_cache(app)
     
     
     app.register_blueprint(customers_bp, url_prefix='/customers')
@@ -41,6 +53,10 @@ def create_app(config_name):
     app.register_blueprint(cars_bp, url_prefix='/cars')
     app.register_blueprint(serviceTicket_bp, url_prefix='/tickets')
     app.register_blueprint(serviceType_bp, url_prefix='/service_types')
+    app.register_blueprint(reports_bp, url_prefix='/reports')
     app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+    init_instrumentation(app)
+
+    register_commands(app)
     
     return app
\ No newline at end of file
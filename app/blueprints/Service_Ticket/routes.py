@@ -1,11 +1,23 @@
-from flask import request, jsonify
-from app.models import db, ServiceTicket, ServiceType
+import uuid
+from flask import request, jsonify, current_app
+from app.models import db, ServiceTicket, ServiceType, Customer, Car, ticket_service
 from marshmallow import ValidationError
-from .schemas import service_ticket_schema, service_tickets_schema, service_ticket_create_schema
-from sqlalchemy import select
+from .schemas import service_ticket_schema, service_ticket_rows, service_ticket_create_schema, service_ticket_bulk_schema
+from sqlalchemy import select, insert
+from sqlalchemy.orm import joinedload
 from . import serviceTicket_bp
-from app.extensions import limiter, cache
-from app.utils.util import admin_required
+from app.extensions import limiter
+from app.utils.util import admin_required, get_date_range, get_total_range
+from app.utils.pagination import paginate, PaginationError
+from app.utils.serializers import sparse_fields, FieldsError
+from app.utils.caching import cached_entity, conditional
+from app.utils.outbox import enqueue, SISTER_SITE_TOPIC
+from app.utils.rollups import invalidate_rollups
+from app.utils.export import get_export_format, stream_rows, export_response, ExportError
+
+# Relationships ServiceTicketSchema serializes, loaded up front instead of one lazy load per ticket;
+# the list endpoint gets the same from service_ticket_rows, which fetches services with one IN query per page
+TICKET_DETAIL_OPTIONS = (joinedload(ServiceTicket.services),)
 
 @serviceTicket_bp.route('/', methods=['POST'])
 @limiter.limit("15 per hour")
@@ -35,43 +47,205 @@ def add_ticket():
         ticket.services = service_types
         
     db.session.add(ticket)
-    db.session.commit()
     
     if ticket.is_major_damage:
+        db.session.flush()
+        enqueue(SISTER_SITE_TOPIC, service_ticket_schema.dump(ticket))
+        db.session.commit()
         
-        print(f"Simulated sending ticket {ticket.id} to sister site")
-        
-        return jsonify({'message': 'Ticket created and sent to sister site', 'ticket': service_ticket_schema.dump(ticket)}), 201
+        return jsonify({'message': 'Ticket created and queued for sister site', 'ticket': service_ticket_schema.dump(ticket)}), 201
+
+    db.session.commit()
     
     return jsonify({'message': 'Ticekt created', 'ticket': service_ticket_schema.dump(ticket)}), 201
 
+def _insert_tickets(rows):
+    # insertmanyvalues batches RETURNING on SQLite/Postgres; MySQL has no executemany RETURNING
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(ServiceTicket).returning(ServiceTicket.id, sort_by_parameter_order=True)
+        return list(db.session.execute(stmt, rows).scalars())
+    # One executemany tagged with a batch id, then the ids read back; they increase in insert order
+    batch = uuid.uuid4().hex
+    db.session.execute(insert(ServiceTicket), [dict(row, import_batch=batch) for row in rows])
+    return list(db.session.execute(
+        select(ServiceTicket.id).where(ServiceTicket.import_batch == batch).order_by(ServiceTicket.id)
+    ).scalars())
+
+@serviceTicket_bp.route('/bulk', methods=['POST'])
+@limiter.limit("10 per hour")
+@admin_required
+def add_tickets_bulk():
+    data = request.get_json()
+    items = data.get('tickets') if isinstance(data, dict) else data
+    max_items = current_app.config.get('BULK_TICKET_MAX', 5000)
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Expected a non-empty list of tickets'}), 400
+    if len(items) > max_items:
+        return jsonify({'message': f'At most {max_items} tickets per request'}), 400
+
+    requested_type_ids = set()
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get('service_type_ids'), list):
+            requested_type_ids.update(i for i in item['service_type_ids'] if isinstance(i, int))
+
+    service_types = {
+        s.id: s for s in db.session.execute(select(ServiceType).where(ServiceType.id.in_(requested_type_ids))).scalars()
+    }
+
+    loaded = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'errors': {'_schema': ['Expected an object']}})
+            continue
+
+        type_ids = item.get('service_type_ids', [])
+        if not isinstance(type_ids, list):
+            errors.append({'index': index, 'errors': {'service_type_ids': ['Must be a list of ids']}})
+            continue
+
+        if not all(isinstance(i, int) and not isinstance(i, bool) for i in type_ids):
+            errors.append({'index': index, 'errors': {'service_type_ids': ['Must be a list of integer ids']}})
+            continue
+
+        try:
+            row = service_ticket_bulk_schema.load({k: v for k, v in item.items() if k != 'service_type_ids'})
+        except ValidationError as e:
+            errors.append({'index': index, 'errors': e.messages})
+            continue
+
+        invalid_ids = [i for i in type_ids if i not in service_types]
+        if invalid_ids:
+            errors.append({'index': index, 'errors': {'service_type_ids': ['Invalid service_type_ids']}, 'invalid_ids': invalid_ids})
+            continue
+
+        loaded.append((index, row, list(dict.fromkeys(type_ids))))
+
+    customer_ids = {row['customer_id'] for _, row, _ in loaded}
+    car_ids = {row['car_id'] for _, row, _ in loaded}
+    known_customers = set(db.session.execute(select(Customer.id).where(Customer.id.in_(customer_ids))).scalars())
+    known_cars = set(db.session.execute(select(Car.id).where(Car.id.in_(car_ids))).scalars())
+
+    valid = []
+    for index, row, type_ids in loaded:
+        missing = {}
+        if row['customer_id'] not in known_customers:
+            missing['customer_id'] = ['Customer not found']
+        if row['car_id'] not in known_cars:
+            missing['car_id'] = ['Car not found']
+        if missing:
+            errors.append({'index': index, 'errors': missing})
+        else:
+            row.setdefault('is_major_damage', False)
+            # Core inserts skip the services collection events, so the totals are set here
+            row['total_price'] = round(sum(service_types[i].price for i in type_ids), 2)
+            row['service_count'] = len(type_ids)
+            valid.append((index, row, type_ids))
+
+    created = []
+    chunk_size = current_app.config.get('BULK_INSERT_CHUNK', 500)
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        ticket_ids = _insert_tickets([row for _, row, _ in chunk])
+
+        links = [
+            {'service_ticket_id': ticket_id, 'service_type_id': type_id}
+            for ticket_id, (_, _, type_ids) in zip(ticket_ids, chunk)
+            for type_id in type_ids
+        ]
+        if links:
+            db.session.execute(insert(ticket_service), links)
+
+        for ticket_id, (index, row, type_ids) in zip(ticket_ids, chunk):
+            if row['is_major_damage']:
+                payload = dict(row, id=ticket_id, services=[service_types[i] for i in type_ids])
+                enqueue(SISTER_SITE_TOPIC, service_ticket_schema.dump(payload))
+            created.append({'index': index, 'id': ticket_id})
+
+    # Back-dated tickets land in days whose report rollups are already built
+    if valid:
+        invalidate_rollups(db.session.connection(), {row['service_date'] for _, row, _ in valid})
+    db.session.commit()
+
+    status = 201 if not errors else 207 if created else 400
+    return jsonify({
+        'message': f'Created {len(created)} of {len(items)} tickets',
+        'created': created,
+        'errors': sorted(errors, key=lambda e: e['index'])
+    }), status
+
 @serviceTicket_bp.route('/', methods=['GET'])
+@conditional(ServiceTicket, depends_on=(ServiceType,))
 def get_tickets():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        offset = (page - 1) * per_page
-        total = db.session.execute(select(ServiceTicket)).scalars().all()
-        total_count = len(total)
-        
-        query = select(ServiceTicket).offset(offset).limit(per_page)
-        tickets = db.session.execute(query).scalars().all()
-        
-        return jsonify({
-            'page': page,
-            'per_page': per_page,
-            'total_tickets': total_count,
-            'tickets': service_tickets_schema.dump(tickets)
-        }), 200
+        min_total, max_total = get_total_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query = select(ServiceTicket)
+    if min_total is not None:
+        query = query.where(ServiceTicket.total_price >= min_total)
+    if max_total is not None:
+        query = query.where(ServiceTicket.total_price <= max_total)
+
+    try:
+        sort_keys = {'service_date': ServiceTicket.service_date, 'total_price': ServiceTicket.total_price}
+        return jsonify(paginate(query, ServiceTicket, service_ticket_rows, 'tickets', 'total_tickets', sort_keys)), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Error fetching Tickets', 'error': str(e)}), 500
 
+@serviceTicket_bp.route('/export', methods=['GET'])
+@admin_required
+def export_tickets():
+    try:
+        fmt = get_export_format(request.args)
+        start, end = get_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    columns = ['id', 'service_date', 'customer_id', 'car_id', 'VIN', 'car_issue', 'is_major_damage']
+    query = select(*[getattr(ServiceTicket, c) for c in columns]).order_by(ServiceTicket.id)
+    if start:
+        query = query.where(ServiceTicket.service_date >= start)
+    if end:
+        query = query.where(ServiceTicket.service_date <= end)
+
+    def records():
+        # Service links are looked up per streamed batch on a second connection,
+        # since MySQL can't run another query while a streaming cursor is open
+        with db.session.get_bind().connect() as links_conn:
+            for partition in stream_rows(db.session, query):
+                ids = [row.id for row in partition]
+                links = links_conn.execute(
+                    select(ticket_service.c.service_ticket_id, ticket_service.c.service_type_id)
+                    .where(ticket_service.c.service_ticket_id.in_(ids))
+                    .order_by(ticket_service.c.service_ticket_id, ticket_service.c.service_type_id)
+                )
+                services = {}
+                for ticket_id, type_id in links:
+                    services.setdefault(ticket_id, []).append(type_id)
+
+                for row in partition:
+                    yield dict(row._asdict(), service_type_ids=services.get(row.id, []))
+
+    return export_response(fmt, columns + ['service_type_ids'], records(), 'tickets')
+
 @serviceTicket_bp.route('/<int:id>', methods=['GET'])
+@conditional(ServiceTicket, 'id', depends_on=(ServiceType,))
+@cached_entity(ServiceTicket, depends_on=(ServiceType,))
 def get_ticket(id):
-    ticket = db.session.get(ServiceTicket, id)
+    try:
+        options, schema = sparse_fields(ServiceTicket, service_ticket_schema, TICKET_DETAIL_OPTIONS)
+    except FieldsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    ticket = db.session.get(ServiceTicket, id, options=options)
     if not ticket:
-        return jsonify({'message': 'Ticket not found'})
-    return service_ticket_schema.jsonify(ticket)
+        return jsonify({'message': 'Ticket not found'}), 404
+    return schema.jsonify(ticket)
 
 
 @serviceTicket_bp.route('/<int:ticket_id>/assign-mechanic/<int:employee_id>', methods=['PUT'])
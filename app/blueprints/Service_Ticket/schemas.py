@@ -1,5 +1,6 @@
 from app.extensions import ma
 from app.models import db, ServiceTicket
+from app.utils.serializers import RowSerializer
 from marshmallow import fields, EXCLUDE
 
 class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
@@ -9,6 +10,8 @@ class ServiceTicketSchema(ma.SQLAlchemyAutoSchema):
         model = ServiceTicket
         sqla_session = db.session
         load_instance = True
+        exclude = ('updated_at', 'import_batch')
+        dump_only = ('total_price', 'service_count')
         include_fk = True
         
 class ServiceTicketCreateSchema(ServiceTicketSchema):
@@ -17,5 +20,7 @@ class ServiceTicketCreateSchema(ServiceTicketSchema):
         
 service_ticket_schema = ServiceTicketSchema()
 service_tickets_schema = ServiceTicketSchema(many=True)
+service_ticket_rows = RowSerializer(service_tickets_schema, ServiceTicket)
 
 service_ticket_create_schema = ServiceTicketCreateSchema()
+service_ticket_bulk_schema = ServiceTicketCreateSchema(load_instance=False, exclude=['id'])
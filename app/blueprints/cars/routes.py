@@ -1,11 +1,14 @@
 from flask import request, jsonify
-from sqlalchemy import select
+from sqlalchemy import select, func, and_
 from marshmallow import ValidationError
-from .schemas import car_schema, cars_schema
+from .schemas import car_schema, car_rows
 from app.models import db, Car
 from . import cars_bp
-from app.extensions import cache
-from app.utils.util import token_required
+from app.utils.util import token_required, admin_required
+from app.utils.pagination import paginate, PaginationError
+from app.utils.serializers import sparse_fields, FieldsError
+from app.utils.caching import cached_entity, conditional
+from app.utils.export import get_export_format, stream_rows, export_response, ExportError
 
 @cars_bp.route('/', methods=['POST'])
 @token_required
@@ -18,43 +21,90 @@ def add_car():
     db.session.commit()
     return jsonify({'message': 'Car added', 'car': car_schema.dump(car)}), 201
 
+def _prefix_match(column, prefix):
+    # A half-open range instead of LIKE so the lower() expression indexes can be used
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+def _contains_match(column, text):
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.like(f'%{escaped}%', escape='\\')
+
 @cars_bp.route('/search', methods=['GET'])
+@conditional(Car)
 def search_car():
-    make = request.args.get('make')
+    match = request.args.get('match', 'prefix')
+    if match not in ('prefix', 'contains'):
+        return jsonify({'message': 'match must be prefix or contains'}), 400
+
+    filters = []
+    for field in ('make', 'model'):
+        value = request.args.get(field, '').strip().lower()
+        if value:
+            column = func.lower(getattr(Car, field))
+            filters.append(_prefix_match(column, value) if match == 'prefix' else _contains_match(column, value))
+
+    color = request.args.get('color', '').strip().lower()
+    if color:
+        filters.append(func.lower(Car.color) == color)
     
-    query = select(Car).where(Car.make.like(f'%{make}%'))
-    cars = db.session.execute(query).scalars().all()
+    model_year = request.args.get('model_year')
+    if model_year:
+        if not model_year.isdigit():
+            return jsonify({'message': 'model_year must be an integer'}), 400
+        filters.append(Car.model_year == int(model_year))
     
-    return cars_schema.jsonify(cars)
+    if not filters:
+        return jsonify({'message': 'Provide at least one of make, model, model_year or color'}), 400
+
+    try:
+        sort_keys = {'make': Car.make, 'model': Car.model}
+        return jsonify(paginate(select(Car).where(*filters), Car, car_rows, 'cars', 'total_count', sort_keys)), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'message': str(e)}), 400
 
 @cars_bp.route('/', methods=['GET'])
+@conditional(Car)
 def get_cars():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        offset = (page - 1) * per_page
-        total = db.session.execute(select(Car)).scalars().all()
-        total_count = len(total)
-        
-        query = select(Car).offset(offset).limit(per_page)
-        cars = db.session.execute(query).scalars().all()
-        
-        return jsonify({
-            'page': page,
-            'per_page': per_page,
-            'total_count': total_count,
-            'cars': cars_schema.dump(cars)
-        }), 200
+        sort_keys = {'make': Car.make, 'model': Car.model}
+        return jsonify(paginate(select(Car), Car, car_rows, 'cars', 'total_count', sort_keys)), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Error fetching Cars', 'error': str(e)}), 500
 
+@cars_bp.route('/export', methods=['GET'])
+@admin_required
+def export_cars():
+    try:
+        fmt = get_export_format(request.args)
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+
+    columns = ['id', 'make', 'model', 'model_year', 'color', 'customer_id']
+    query = select(*[getattr(Car, c) for c in columns]).order_by(Car.id)
+
+    def records():
+        for partition in stream_rows(db.session, query):
+            for row in partition:
+                yield row._asdict()
+
+    return export_response(fmt, columns, records(), 'cars')
+
 @cars_bp.route('/<int:id>', methods=['GET'])
-@cache.cached(timeout=30)
+@conditional(Car, 'id')
+@cached_entity(Car)
 def get_car(id):
-    car = db.session.get(Car, id)
+    try:
+        options, schema = sparse_fields(Car, car_schema)
+    except FieldsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    car = db.session.get(Car, id, options=options)
     if not car:
         return jsonify({'message': 'Car not found'}), 404
-    return car_schema.jsonify(car)
+    return schema.jsonify(car)
 
 @cars_bp.route('/<int:id>', methods=['PUT'])
 @token_required
@@ -1,5 +1,6 @@
 from app.extensions import ma
 from app.models import db, Car
+from app.utils.serializers import RowSerializer
 
 
 class CarSchema(ma.SQLAlchemyAutoSchema):
@@ -7,7 +8,9 @@ class CarSchema(ma.SQLAlchemyAutoSchema):
         model = Car
         sqla_session = db.session
         load_instance = True
+        exclude = ('updated_at',)
         include_fk = True
         
 car_schema = CarSchema()
-cars_schema = CarSchema(many=True)
\ No newline at end of file
+cars_schema = CarSchema(many=True)
+car_rows = RowSerializer(cars_schema, Car)
\ No newline at end of file
@@ -1,13 +1,18 @@
-from .schemas import customer_schema, customers_schema, login_schema
+from .schemas import customer_schema, customer_rows, login_schema
 from app.blueprints.cars.schemas import cars_schema, car_schema
 from flask import request, jsonify
 from marshmallow import ValidationError
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 from app.models import db, Customer, Car
 from . import customers_bp
-from app.extensions import limiter, cache
-from app.utils.util import encode_token, token_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.extensions import limiter
+from app.utils.util import encode_token, token_required, admin_required
+from app.utils.pagination import paginate, PaginationError
+from app.utils.serializers import sparse_fields, load_options, get_fields, narrow_schema, FieldsError
+from app.utils.caching import cached_entity, conditional
+from app.utils.export import get_export_format, stream_rows, export_response, ExportError
+from app.utils.passwords import hash_password, verify_password, needs_rehash, HashingBusyError
 
 @customers_bp.route("/login", methods=['POST'])
 def login():
@@ -21,7 +26,15 @@ def login():
     query = select(Customer).where(Customer.email == email)
     customer = db.session.execute(query).scalar_one_or_none()
     
-    if customer and check_password_hash(customer.password, password):
+    try:
+        valid = customer is not None and verify_password(customer.password, password)
+        if valid and needs_rehash(customer.password):
+            customer.password = hash_password(password)
+            db.session.commit()
+    except HashingBusyError:
+        return jsonify({'message': 'Server busy, please retry'}), 503
+
+    if valid:
         auth_token = encode_token(customer.id, customer.role)
         
         response = {
@@ -49,7 +62,10 @@ def add_customer():
     if existing_customer:
         return jsonify({'message': 'Email is already in use'}), 409
     
-    customer_data.password = generate_password_hash(customer_data.password)
+    try:
+        customer_data.password = hash_password(customer_data.password)
+    except HashingBusyError:
+        return jsonify({'message': 'Server busy, please retry'}), 503
     
     new_customer = customer_data
     db.session.add(new_customer)
@@ -81,43 +97,67 @@ def add_car_for_customer(customer_id):
     return jsonify({'message': 'Car added successfully for customer', 'car': car_schema.dump(car)}), 201
 
 @customers_bp.route("/<int:customer_id>/cars", methods=['GET'])
+@conditional(Customer, 'customer_id')
+@cached_entity(Customer, id_arg='customer_id')
 def get_customer_cars(customer_id):
-    customer = db.session.get(Customer, customer_id)
+    try:
+        only = get_fields(list(cars_schema.dump_fields))
+    except FieldsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    options = [selectinload(Customer.cars).options(*load_options(Car, only))] if only else []
+    customer = db.session.get(Customer, customer_id, options=options)
     if not customer:
-        return jsonify({'message': 'Customer not found'})
+        return jsonify({'message': 'Customer not found'}), 404
     
-    return cars_schema.jsonify(customer.cars), 200
+    return narrow_schema(cars_schema, only).jsonify(customer.cars), 200
 
 @customers_bp.route("/", methods=['GET'])
+@conditional(Customer)
 def get_customers():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        offset = (page - 1) * per_page
-        total = db.session.execute(select(Customer)).scalars().all()
-        total_count = len(total)
-            
-        query = select(Customer).offset(offset).limit(per_page)
-        customers = db.session.execute(query).scalars().all()
-        
-        return jsonify({
-            'page': page,
-            'per_page': per_page,
-            'total_customers': total_count,
-            "customers": customers_schema.dump(customers)
-        }), 200
+        sort_keys = {'name': Customer.name}
+        return jsonify(paginate(select(Customer), Customer, customer_rows, 'customers', 'total_customers', sort_keys)), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Error fetching Customers', 'error': str(e)}), 500
 
+@customers_bp.route("/export", methods=['GET'])
+@admin_required
+def export_customers():
+    try:
+        fmt = get_export_format(request.args)
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # password hashes never leave the database in an export
+    columns = ['id', 'name', 'email', 'phone', 'address', 'role']
+    query = select(*[getattr(Customer, c) for c in columns]).order_by(Customer.id)
+
+    def records():
+        for partition in stream_rows(db.session, query):
+            for row in partition:
+                yield row._asdict()
+
+    return export_response(fmt, columns, records(), 'customers')
+
 @customers_bp.route("/<int:id>", methods=['GET'])
+@conditional(Customer, 'id')
+@cached_entity(Customer)
 def get_customer(id):
-    query = select(Customer).where(Customer.id == id)
+    try:
+        options, schema = sparse_fields(Customer, customer_schema)
+    except FieldsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    query = select(Customer).where(Customer.id == id).options(*options)
     result = db.session.execute(query).scalars().first()
     
     if result is None:
         return jsonify({"Error": "Customer not found"}),404
     
-    return customer_schema.jsonify(result)
+    return schema.jsonify(result)
 
 @customers_bp.route('/<int:id>', methods=['PUT'])
 @token_required
@@ -1,6 +1,7 @@
 from app.extensions import ma
 from app.models import db, Customer
 from app.blueprints.cars.schemas import CarSchema
+from app.utils.serializers import RowSerializer
 
 class CustomerSchema(ma.SQLAlchemyAutoSchema):
     cars = ma.Nested(CarSchema, many=True)
@@ -9,7 +10,9 @@ class CustomerSchema(ma.SQLAlchemyAutoSchema):
         model = Customer
         sqla_session = db.session
         load_instance = True
+        exclude = ('updated_at',)
         
 customer_schema = CustomerSchema()
 customers_schema = CustomerSchema(many=True)
+customer_rows = RowSerializer(customers_schema, Customer)
 login_schema = CustomerSchema(exclude=['name', 'address', 'phone'])
\ No newline at end of file
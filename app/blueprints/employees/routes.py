@@ -1,12 +1,14 @@
-from .schemas import employee_schema, employees_schema, login_schema
+from .schemas import employee_schema, employee_rows, login_schema
 from flask import request, jsonify
 from marshmallow import ValidationError
-from sqlalchemy import select
-from app.models import db, Employee
+from sqlalchemy import select, func
+from app.models import db, Employee, ServiceTicket, mechanic_ticket
 from . import employee_bp
-from app.extensions import cache
-from app.utils.util import encode_token, admin_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.util import encode_token, admin_required, get_date_range
+from app.utils.pagination import paginate, PaginationError
+from app.utils.serializers import sparse_fields, FieldsError
+from app.utils.caching import cached_entity, conditional
+from app.utils.passwords import hash_password, verify_password, needs_rehash, HashingBusyError
 
 @employee_bp.route('/', methods=['POST'])
 def add_employee():
@@ -22,7 +24,10 @@ def add_employee():
     if existing_employee:
         return jsonify({'message': 'Employee with this email already exists'}), 409
     
-    employee.password = generate_password_hash(employee.password)
+    try:
+        employee.password = hash_password(employee.password)
+    except HashingBusyError:
+        return jsonify({'message': 'Server busy, please retry'}), 503
     
     db.session.add(employee)
     db.session.commit()
@@ -40,7 +45,15 @@ def login():
     query = select(Employee).where(Employee.email == email)
     employee = db.session.execute(query).scalar_one_or_none()
     
-    if employee and check_password_hash(employee.password, password):
+    try:
+        valid = employee is not None and verify_password(employee.password, password)
+        if valid and needs_rehash(employee.password):
+            employee.password = hash_password(password)
+            db.session.commit()
+    except HashingBusyError:
+        return jsonify({'message': 'Server busy, please retry'}), 503
+
+    if valid:
         auth_token = encode_token(employee.id, employee.role)
         
         response = {
@@ -55,19 +68,55 @@ def login():
     
 @employee_bp.route('/working_tickets', methods=['GET'])
 def tickets_working_on():
-    query = select(Employee)
-    mechanics = db.session.execute(query).scalars().all()
+    try:
+        start, end = get_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
-    mechanics.sort(key= lambda m: len(m.tickets), reverse=True)
+    limit = request.args.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) < 1:
+            return jsonify({'message': 'limit must be a positive integer'}), 400
+        limit = int(limit)
     
-    mechanics = [m for m in mechanics if m.tickets]
+    ticket_filters = []
+    if start:
+        ticket_filters.append(ServiceTicket.service_date >= start)
+    if end:
+        ticket_filters.append(ServiceTicket.service_date <= end)
+
+    ticket_count = func.count(mechanic_ticket.c.service_ticket_id).label('ticket_count')
+    query = (
+        select(Employee.id, Employee.name, ticket_count)
+        .join(mechanic_ticket, mechanic_ticket.c.employee_id == Employee.id)
+        .group_by(Employee.id, Employee.name)
+        .order_by(ticket_count.desc(), Employee.id)
+        .limit(limit)
+    )
+    if ticket_filters:
+        query = query.join(ServiceTicket, ServiceTicket.id == mechanic_ticket.c.service_ticket_id).where(*ticket_filters)
+
+    mechanics = db.session.execute(query).all()
+
+    ticket_ids = {m.id: [] for m in mechanics}
+    if ticket_ids:
+        id_query = (
+            select(mechanic_ticket.c.employee_id, mechanic_ticket.c.service_ticket_id)
+            .where(mechanic_ticket.c.employee_id.in_(ticket_ids))
+            .order_by(mechanic_ticket.c.service_ticket_id)
+        )
+        if ticket_filters:
+            id_query = id_query.join(ServiceTicket, ServiceTicket.id == mechanic_ticket.c.service_ticket_id).where(*ticket_filters)
+
+        for employee_id, ticket_id in db.session.execute(id_query):
+            ticket_ids[employee_id].append(ticket_id)
     
     result = [
         {
             "id": m.id,
             "name": m.name,
-            "ticket_count": len(m.tickets),
-            "ticket_ids": [t.id for t in m.tickets]
+            "ticket_count": m.ticket_count,
+            "ticket_ids": ticket_ids[m.id]
         }
         for m in mechanics
     ]
@@ -75,32 +124,29 @@ def tickets_working_on():
     return jsonify(result)
 
 @employee_bp.route('/', methods=['GET'])
+@conditional(Employee)
 def get_employees():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        offset = (page -1) * per_page
-        total = db.session.execute(select(Employee)).scalars().all()
-        total_count = len(total)
-        
-        query = select(Employee).offset(offset).limit(per_page)
-        employees = db.session.execute(query).scalars().all()
-        
-        return jsonify({
-            'page': page,
-            'per_page': per_page,
-            'total_employee': total_count,
-            'employees': employees_schema.dump(employees)
-        }), 200
+        sort_keys = {'name': Employee.name}
+        return jsonify(paginate(select(Employee), Employee, employee_rows, 'employees', 'total_employee', sort_keys)), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Error fetching Employees', 'error': str(e)}), 500
         
 @employee_bp.route('/<int:id>', methods=['GET'])
+@conditional(Employee, 'id')
+@cached_entity(Employee)
 def get_employee(id):
-    employee = db.session.get(Employee, id)
+    try:
+        options, schema = sparse_fields(Employee, employee_schema)
+    except FieldsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    employee = db.session.get(Employee, id, options=options)
     if not employee:
         return jsonify({'message': 'Employee not found'}), 404
-    return employee_schema.jsonify(employee)
+    return schema.jsonify(employee)
 
 
 @employee_bp.route('/<int:id>', methods=['PUT'])
@@ -1,12 +1,15 @@
 from app.models import db, Employee
 from app.extensions import ma
+from app.utils.serializers import RowSerializer
 
 class EmployeeSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = Employee
         sqla_session = db.session
         load_instance = True
+        exclude = ('updated_at',)
         
 employee_schema = EmployeeSchema()
 employees_schema = EmployeeSchema(many=True)
+employee_rows = RowSerializer(employees_schema, Employee)
 login_schema = EmployeeSchema(exclude=['name', 'address', 'phone', 'salary'])
\ No newline at end of file
@@ -0,0 +1,144 @@
+from datetime import timedelta
+from flask import request, jsonify, current_app
+from sqlalchemy import select, func
+from app.models import db, Customer, Employee, ServiceTicket, ServiceType, utcnow
+from . import reports_bp
+from app.utils.util import admin_required, get_date_range
+from app.utils.caching import conditional
+from app.utils.pagination import MAX_PER_PAGE
+from app.utils.rollups import PERIODS, DAY_TOTAL, period_start, periods, report_rows, fold
+
+DEFAULT_LIFETIME_LIMIT = 50
+
+
+def _report_args(args):
+    period = args.get('period', 'month')
+    if period not in PERIODS:
+        raise ValueError(f'period must be one of: {", ".join(PERIODS)}')
+
+    start, end = get_date_range(args)
+    # A year back to today by default, starting on a period boundary
+    end = end or utcnow().date()
+    start = start or period_start(end - timedelta(days=364), period)
+    if start > end:
+        raise ValueError('from must be on or before to')
+
+    max_days = current_app.config['REPORT_MAX_DAYS']
+    if (end - start).days >= max_days:
+        raise ValueError(f'A report covers at most {max_days} days')
+
+    return period, start, end
+
+
+def _positive_int(args, name, default=None):
+    value = args.get(name)
+    if value is None:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        raise ValueError(f'{name} must be a positive integer')
+    return int(value)
+
+
+@reports_bp.route('/revenue', methods=['GET'])
+@admin_required
+def revenue():
+    try:
+        period, start, end = _report_args(request.args)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    by = request.args.get('by')
+    if by not in (None, 'service_type'):
+        return jsonify({'message': 'by must be service_type'}), 400
+
+    totals = fold(report_rows('revenue', start, end), period)
+
+    rows = []
+    if by:
+        type_ids = {subject for _, subject in totals if subject != DAY_TOTAL}
+        names = dict(db.session.execute(select(ServiceType.id, ServiceType.name).where(ServiceType.id.in_(type_ids))).all())
+        for (start_of_period, type_id), (tickets, _, amount) in sorted(totals.items()):
+            if type_id != DAY_TOTAL:
+                rows.append({'period_start': start_of_period.isoformat(), 'service_type_id': type_id,
+                             'name': names.get(type_id), 'tickets': tickets, 'revenue': round(amount, 2)})
+    else:
+        # Every period in range, including the empty ones
+        for start_of_period in periods(start, end, period):
+            tickets, services, amount = totals.get((start_of_period, DAY_TOTAL), (0, 0, 0.0))
+            rows.append({'period_start': start_of_period.isoformat(), 'tickets': tickets, 'services': services,
+                         'revenue': round(amount, 2)})
+
+    day_totals = [total for (_, subject), total in totals.items() if subject == DAY_TOTAL]
+    return jsonify({
+        'period': period,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'revenue': rows,
+        'total_tickets': sum(total[0] for total in day_totals),
+        'total_revenue': round(sum(total[2] for total in day_totals), 2)
+    }), 200
+
+
+@reports_bp.route('/mechanic-load', methods=['GET'])
+@admin_required
+def mechanic_load():
+    try:
+        period, start, end = _report_args(request.args)
+        employee_id = _positive_int(request.args, 'employee_id')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    totals = fold(report_rows('mechanic_load', start, end), period)
+    employee_ids = {subject for _, subject in totals if subject != DAY_TOTAL and employee_id in (None, subject)}
+    names = dict(db.session.execute(select(Employee.id, Employee.name).where(Employee.id.in_(employee_ids))).all())
+
+    rows = [
+        {'period_start': start_of_period.isoformat(), 'employee_id': subject, 'name': names.get(subject),
+         'tickets': tickets, 'services': services}
+        for (start_of_period, subject), (tickets, services, _) in sorted(totals.items())
+        if subject in employee_ids
+    ]
+    return jsonify({'period': period, 'from': start.isoformat(), 'to': end.isoformat(), 'mechanics': rows}), 200
+
+
+@reports_bp.route('/customer-lifetime', methods=['GET'])
+@admin_required
+@conditional(ServiceTicket, depends_on=(Customer,))
+def customer_lifetime():
+    max_limit = current_app.config.get('MAX_PER_PAGE', MAX_PER_PAGE)
+    try:
+        limit = _positive_int(request.args, 'limit', DEFAULT_LIFETIME_LIMIT)
+        customer_id = _positive_int(request.args, 'customer_id')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if limit > max_limit:
+        return jsonify({'message': f'limit must be at most {max_limit}'}), 400
+
+    # One GROUP BY over the stored per-ticket totals; no service rows are read
+    total_spent = func.sum(func.coalesce(ServiceTicket.total_price, 0)).label('total_spent')
+    query = (
+        select(Customer.id, Customer.name, func.count(ServiceTicket.id).label('tickets'),
+               func.sum(func.coalesce(ServiceTicket.service_count, 0)).label('services'), total_spent,
+               func.min(ServiceTicket.service_date).label('first_visit'),
+               func.max(ServiceTicket.service_date).label('last_visit'))
+        .join(ServiceTicket, ServiceTicket.customer_id == Customer.id)
+        .group_by(Customer.id, Customer.name)
+        .order_by(total_spent.desc(), Customer.id)
+        .limit(limit)
+    )
+    if customer_id:
+        query = query.where(Customer.id == customer_id)
+
+    customers = [
+        {
+            'customer_id': c.id,
+            'name': c.name,
+            'tickets': c.tickets,
+            'services': c.services or 0,
+            'total_spent': round(c.total_spent or 0, 2),
+            'first_visit': c.first_visit.isoformat(),
+            'last_visit': c.last_visit.isoformat()
+        }
+        for c in db.session.execute(query)
+    ]
+    return jsonify({'customers': customers}), 200
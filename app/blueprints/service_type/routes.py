@@ -1,11 +1,14 @@
 from flask import request, jsonify
-from app.models import db, ServiceType, ServiceTicket
+from app.models import db, ServiceType, ServiceTicket, shift_ticket_totals
 from marshmallow import ValidationError
-from .schemas import service_type_schema, service_types_schema
+from .schemas import service_type_schema, service_type_rows
 from app.blueprints.Service_Ticket.schemas import service_ticket_schema
 from sqlalchemy import select
 from . import serviceType_bp
 from app.utils.util import admin_required
+from app.utils.pagination import paginate, PaginationError
+from app.utils.caching import conditional
+from app.utils.serializers import FieldsError
 
 @serviceType_bp.route("/", methods=['POST'])
 @admin_required
@@ -56,23 +59,12 @@ def remove_service_type_from_ticket(service_type_id, ticket_id):
     return jsonify({'message': f'Service type {service_type_id} remove from ticket {ticket_id}'})
 
 @serviceType_bp.route("/", methods=['GET'])
+@conditional(ServiceType)
 def get_service_types():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        offset = (page - 1) * per_page
-        total = db.session.execute(select(ServiceType)).scalars().all()
-        total_count = len(total)
-        
-        query = select(ServiceType).offset(offset).limit(per_page)
-        service_types = db.session.execute(query).scalars().all()
-        
-        return jsonify({
-            'page': page,
-            'per_page': per_page,
-            'total_service_types': total_count,
-            'service_types': service_types_schema.dump(service_types)
-        }), 200
+        return jsonify(paginate(select(ServiceType), ServiceType, service_type_rows, 'service_types', 'total_service_types')), 200
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': 'Error fetching service types', 'error': str(e)}), 500
 
@@ -83,11 +75,14 @@ def update_service(id):
     if not service_type:
         return jsonify({'message': 'Service not found'}), 404
     
+    old_price = service_type.price
     try:
         service_type = service_type_schema.load(request.json, instance=service_type)
     except ValidationError as e:
         return jsonify(e.messages), 400
     
+    if service_type.price != old_price:
+        db.session.execute(shift_ticket_totals(id, service_type.price - old_price))
     db.session.commit()
     return service_type_schema.jsonify(service_type), 200
 
@@ -98,6 +93,8 @@ def delete_service_type(id):
     if not service_type:
         return jsonify({'message': 'service type not found'})
     
+    # Has to run while the ticket_service rows still exist
+    db.session.execute(shift_ticket_totals(id, -service_type.price, -1))
     db.session.delete(service_type)
     db.session.commit()
     
@@ -1,12 +1,15 @@
 from app.extensions import ma
 from app.models import db, ServiceType
+from app.utils.serializers import RowSerializer
 
 class ServiceTypeSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = ServiceType
         sqla_session = db.session
         load_instance = True
+        exclude = ('updated_at',)
         include_fk = True
         
 service_type_schema = ServiceTypeSchema()
-service_types_schema = ServiceTypeSchema(many=True)
\ No newline at end of file
+service_types_schema = ServiceTypeSchema(many=True)
+service_type_rows = RowSerializer(service_types_schema, ServiceType)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import time
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, func
+from app.models import db, ServiceTicket, Customer, create_missing_indexes, repair_ticket_totals, utcnow
+from app.utils.caching import invalidate
+from app.utils.outbox import run_worker, dead_letters, retry_dead_letters
+from app.utils.passwords import hash_password
+from app.utils.seeding import Seeder, SeedError, SERVICE_TYPES
+from app.utils.rollups import REPORTS, materialize, invalidate_rollups
+
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes_command():
+    created = create_missing_indexes()
+    if created:
+        for name in created:
+            click.echo(f'Created index {name}')
+    else:
+        click.echo('All indexes already exist')
+
+
+@click.command('repair-ticket-totals')
+@click.option('--dry-run', is_flag=True, help='Only count the tickets whose stored totals are wrong.')
+@click.option('--chunk-size', default=10_000, show_default=True, help='Ticket ids per UPDATE and transaction.')
+@with_appcontext
+def repair_ticket_totals_command(dry_run, chunk_size):
+    repaired = repair_ticket_totals(chunk_size=chunk_size, dry_run=dry_run)
+    if dry_run:
+        click.echo(f'{len(repaired)} ticket(s) have stale totals')
+    else:
+        if repaired:
+            # Only the repaired tickets' cached bodies and the report rollups were built from the old totals
+            for ticket_id, _ in repaired:
+                invalidate(ServiceTicket, ticket_id)
+            for customer_id in {customer_id for _, customer_id in repaired}:
+                invalidate(Customer, customer_id)
+            with db.engine.begin() as conn:
+                invalidate_rollups(conn)
+        click.echo(f'Repaired totals on {len(repaired)} ticket(s)')
+
+
+@click.command('build-report-rollups')
+@click.option('--from', 'start', type=click.DateTime(['%Y-%m-%d']), help='First day; defaults to the oldest ticket.')
+@click.option('--to', 'end', type=click.DateTime(['%Y-%m-%d']), help='Last day; defaults to yesterday.')
+@click.option('--rebuild', is_flag=True, help='Drop the existing rollups first.')
+@with_appcontext
+def build_report_rollups_command(start, end, rebuild):
+    # Run after midnight so the first report request of the day reads only rollups
+    yesterday = utcnow().date() - timedelta(days=1)
+    end = min(end.date() if end else yesterday, yesterday)
+    start = start.date() if start else db.session.execute(select(func.min(ServiceTicket.service_date))).scalar()
+    if rebuild:
+        with db.engine.begin() as conn:
+            invalidate_rollups(conn)
+    if start is None or start > end:
+        click.echo('No completed days to roll up')
+        return
+    for report in REPORTS:
+        click.echo(f'{report}: {materialize(report, start, end)} rows for {start} to {end}')
+
+
+@click.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Deliver everything currently due, then exit.')
+@with_appcontext
+def outbox_worker_command(once):
+    if not current_app.config.get('SISTER_SITE_URL'):
+        raise click.ClickException('SISTER_SITE_URL is not configured')
+    delivered = run_worker(once=once)
+    click.echo(f'Delivered {delivered} message(s)')
+
+
+@click.command('outbox-dead-letters')
+@click.option('--retry', is_flag=True, help='Queue every dead message again with a fresh set of attempts.')
+@with_appcontext
+def outbox_dead_letters_command(retry):
+    if retry:
+        click.echo(f'Requeued {retry_dead_letters()} message(s)')
+        return
+    messages = dead_letters()
+    for message in messages:
+        click.echo(f'{message.id}  {message.dead_at:%Y-%m-%d %H:%M:%S}  attempts={message.attempts}  {message.last_error}')
+    click.echo(f'{len(messages)} dead message(s)')
+
+
+@click.command('seed')
+@click.option('--config', 'config_name', type=click.Choice(['DevelopmentConfig', 'TestingConfig', 'ProductionConfig']),
+              help='Seed the database of this config instead of the one the CLI app uses.')
+@click.option('--customers', default=1000, show_default=True)
+@click.option('--employees', default=20, show_default=True)
+@click.option('--cars', default=1500, show_default=True)
+@click.option('--tickets', default=5000, show_default=True)
+@click.option('--service-types', default=len(SERVICE_TYPES), show_default=True,
+              help='Catalogue entries to ensure exist; extras beyond the named ones are generated.')
+@click.option('--seed', 'random_seed', default=0, show_default=True, help='Random seed, for repeatable datasets.')
+@click.option('--chunk-size', default=5000, show_default=True, help='Rows per INSERT batch and transaction.')
+@click.option('--password', default='password', show_default=True, help='Password for every seeded user.')
+@with_appcontext
+def seed_command(config_name, customers, employees, cars, tickets, service_types, random_seed, chunk_size, password):
+    if config_name:
+        from app import create_app
+        app = create_app(config_name)
+    else:
+        app = current_app._get_current_object()
+
+    def progress(label, done, total):
+        click.echo(f'\r{label}: {done}/{total}', nl=done == total, err=True)
+
+    with app.app_context():
+        db.create_all()
+        # Hashed once with the configured method, so seeded logins cost what real ones do
+        seeder = Seeder(db.engine, seed=random_seed, chunk_size=chunk_size,
+                        password_hash=hash_password(password), progress=progress)
+        start = time.perf_counter()
+        try:
+            counts = seeder.run(customers=customers, employees=employees, cars=cars, tickets=tickets,
+                                service_types=service_types)
+        except SeedError as e:
+            raise click.ClickException(str(e))
+        with db.engine.begin() as conn:
+            invalidate_rollups(conn)
+        elapsed = time.perf_counter() - start
+
+    for table, count in counts.items():
+        seconds = seeder.seconds[table]
+        click.echo(f'{table:<16} {count:>10} rows  {count / seconds if seconds else 0:>10.0f} rows/s')
+    total = sum(counts.values())
+    click.echo(f'{total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)')
+
+
+def register_commands(app):
+    app.cli.add_command(build_report_rollups_command)
+    app.cli.add_command(create_indexes_command)
+    app.cli.add_command(outbox_worker_command)
+    app.cli.add_command(outbox_dead_letters_command)
+    app.cli.add_command(repair_ticket_totals_command)
+    app.cli.add_command(seed_command)
@@ -1,12 +1,22 @@
+import logging
 from flask_marshmallow import Marshmallow
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
 
+logger = logging.getLogger(__name__)
+
 limiter = Limiter(
     key_func=get_remote_address,
     # default_limits=["200 per day", "50 per hour"]
 )
-cache = Cache(config={'CACHE_TYPE': 'SimpleCache'})
+cache = Cache()
+
+ma = Marshmallow()
+
 
-ma = Marshmallow()
\ No newline at end of file
+def warn_process_local_limits(app):
+    # memory:// counts per worker, so N gunicorn workers let through N times each limit
+    if not (app.debug or app.testing) and app.config.get('RATELIMIT_STORAGE_URI', 'memory://') == 'memory://':
+        logger.warning('RATELIMIT_STORAGE_URI is memory://: each worker counts requests separately; '
+                       'set RATELIMIT_STORAGE_URI or CACHE_REDIS_URL to enforce limits across workers')
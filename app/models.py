@@ -1,38 +1,56 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from datetime import date
+from sqlalchemy import func, inspect, event, select, update, or_
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, object_session
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import ColumnElement
+from datetime import date, datetime, timezone
 from typing import List
+from app.utils.replica import RoutingSession
 
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class= Base)
+db = SQLAlchemy(model_class= Base, session_options={'class_': RoutingSession})
+
+# Microsecond precision on MySQL so two writes within a second still get different validators
+Timestamp = db.DateTime().with_variant(mysql.DATETIME(fsp=6), 'mysql')
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 mechanic_ticket = db.Table(
     'mechanic_ticket',
     Base.metadata,
     db.Column('employee_id', db.ForeignKey('employee.id'), primary_key=True),
-    db.Column('service_ticket_id', db.ForeignKey('service_ticket.id'), primary_key=True)
+    db.Column('service_ticket_id', db.ForeignKey('service_ticket.id'), primary_key=True, index=True)
 )
 
 ticket_service = db.Table(
     'ticket_service',
     Base.metadata,
     db.Column('service_ticket_id', db.ForeignKey('service_ticket.id'), primary_key=True),
-    db.Column('service_type_id', db.ForeignKey('service_types.id'), primary_key=True)
+    db.Column('service_type_id', db.ForeignKey('service_types.id'), primary_key=True, index=True)
 )
 
 class ServiceTicket(Base):
     __tablename__ = 'service_ticket'
     
     id: Mapped[int] = mapped_column(primary_key= True)
-    service_date: Mapped[date] = mapped_column(db.Date, nullable=False)
-    customer_id: Mapped[int] = mapped_column(db.ForeignKey('customer.id'), nullable=False)
-    car_id: Mapped[int] = mapped_column(db.ForeignKey('car.id'), nullable=False)
-    VIN: Mapped[str] = mapped_column(db.String(220), nullable= False)
+    service_date: Mapped[date] = mapped_column(db.Date, nullable=False, index=True)
+    customer_id: Mapped[int] = mapped_column(db.ForeignKey('customer.id'), nullable=False, index=True)
+    car_id: Mapped[int] = mapped_column(db.ForeignKey('car.id'), nullable=False, index=True)
+    VIN: Mapped[str] = mapped_column(db.String(220), nullable= False, index=True)
     car_issue:  Mapped[str] = mapped_column(db.String(500), nullable= True)
     is_major_damage: Mapped[bool] = mapped_column(db.Boolean, default=False)
+    updated_at: Mapped[datetime] = mapped_column(Timestamp, default=utcnow, onupdate=utcnow, nullable=True, index=True)
+    # Sum of services' prices and their count, kept in step with ticket_service (see _service_added)
+    total_price: Mapped[float] = mapped_column(db.Float(), default=0, nullable=True, index=True)
+    service_count: Mapped[int] = mapped_column(default=0, nullable=True)
+    # Tags the rows of one POST /tickets/bulk chunk so their ids can be read back where RETURNING isn't available
+    import_batch: Mapped[str] = mapped_column(db.String(32), nullable=True, index=True)
     
     employee: Mapped[List['Employee']] = db.relationship('Employee', secondary=mechanic_ticket, back_populates='tickets')
     car: Mapped['Car'] = db.relationship('Car', backref="owner", lazy=True)
@@ -48,6 +66,7 @@ class Customer(Base):
     address: Mapped[str] = mapped_column(db.String(250), nullable=False)
     password: Mapped[str] = mapped_column(db.String(350), nullable=False)
     role: Mapped[str] = mapped_column(db.String(50), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(Timestamp, default=utcnow, onupdate=utcnow, nullable=True, index=True)
     
     cars: Mapped[List['Car']] = db.relationship(back_populates='customer', cascade="all, delete", passive_deletes=True, lazy='selectin')
     
@@ -62,6 +81,7 @@ class Employee(Base):
     password: Mapped[str] = mapped_column(db.String(350), nullable=False)
     salary: Mapped[int] = mapped_column()
     role: Mapped[str] = mapped_column(db.String(50), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(Timestamp, default=utcnow, onupdate=utcnow, nullable=True, index=True)
     
     tickets: Mapped[List['ServiceTicket']] = db.relationship('ServiceTicket', secondary=mechanic_ticket, back_populates='employee')
     
@@ -73,10 +93,19 @@ class Car(Base):
     make: Mapped[str] = mapped_column(db.String(100), nullable=False)
     model: Mapped[str] = mapped_column(db.String(100), nullable=False)
     model_year: Mapped[int] = mapped_column()
+    updated_at: Mapped[datetime] = mapped_column(Timestamp, default=utcnow, onupdate=utcnow, nullable=True, index=True)
     
 
-    customer_id: Mapped[int] = mapped_column(db.ForeignKey("customer.id", ondelete="CASCADE"), nullable=False)
+    customer_id: Mapped[int] = mapped_column(db.ForeignKey("customer.id", ondelete="CASCADE"), nullable=False, index=True)
     customer: Mapped['Customer'] = db.relationship(back_populates='cars')
+
+# Case-insensitive prefix search on make/model seeks these instead of scanning car
+db.Index('ix_car_make_model_lower', func.lower(Car.make), func.lower(Car.model))
+db.Index('ix_car_model_lower', func.lower(Car.model))
+# Year first: it is matched exactly while make is a prefix range, so make=…&model_year=… seeks on both
+db.Index('ix_car_model_year_make_lower', Car.model_year, func.lower(Car.make))
+# The conditional-GET validator for a customer's cars reads max(updated_at) per customer_id
+db.Index('ix_car_customer_id_updated_at', Car.customer_id, Car.updated_at)
     
 class ServiceType(Base):
     __tablename__ = 'service_types'
@@ -85,5 +114,149 @@ class ServiceType(Base):
     name: Mapped[str] = mapped_column(db.String(100), unique=True, nullable=False)
     description: Mapped[str] = mapped_column(db.String(300), nullable=True)
     price: Mapped[float] = mapped_column(db.Float(), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(Timestamp, default=utcnow, onupdate=utcnow, nullable=True, index=True)
+
+    tickets: Mapped[List['ServiceTicket']] = db.relationship('ServiceTicket', secondary=ticket_service, back_populates='services')
+
+
+class OutboxMessage(Base):
+    __tablename__ = 'outbox_message'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    topic: Mapped[str] = mapped_column(db.String(100), nullable=False)
+    payload: Mapped[dict] = mapped_column(db.JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=False)
+    attempts: Mapped[int] = mapped_column(default=0)
+    delivered_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=True)
+    last_error: Mapped[str] = mapped_column(db.String(500), nullable=True)
+    # Set once OUTBOX_MAX_ATTEMPTS is used up; `flask outbox-dead-letters --retry` puts it back in the queue
+    dead_at: Mapped[datetime] = mapped_column(db.DateTime, nullable=True)
+
+class ReportRollup(Base):
+    # Per-day report aggregates, written only for days that are over (see app.utils.rollups);
+    # subject_id is the service type or employee a row belongs to, 0 the whole day
+    __tablename__ = 'report_rollup'
     
-    tickets: Mapped[List['ServiceTicket']] = db.relationship('ServiceTicket', secondary=ticket_service, back_populates='services')
\ No newline at end of file
+    report: Mapped[str] = mapped_column(db.String(20), primary_key=True)
+    day: Mapped[date] = mapped_column(db.Date, primary_key=True)
+    subject_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    tickets: Mapped[int] = mapped_column(default=0)
+    services: Mapped[int] = mapped_column(default=0)
+    amount: Mapped[float] = mapped_column(db.Float(), default=0)
+    computed_at: Mapped[datetime] = mapped_column(Timestamp, default=utcnow)
+
+# The dispatcher only ever looks for undelivered rows that are due
+db.Index('ix_outbox_message_pending', OutboxMessage.delivered_at, OutboxMessage.next_attempt_at)
+
+@event.listens_for(Session, 'before_flush')
+def _touch_updated_at(session, flush_context, instances):
+    # Collection changes (services, mechanics) emit no UPDATE of their own, so onupdate alone would miss them
+    now = utcnow()
+    for obj in session.dirty:
+        if hasattr(obj, 'updated_at') and session.is_modified(obj):
+            obj.updated_at = now
+
+
+def _adjust_totals(ticket, price, count):
+    if inspect(ticket).has_identity:
+        # Relative to the stored value, so two requests changing the same ticket's services both count
+        total, services = ticket.__dict__.get('total_price'), ticket.__dict__.get('service_count')
+        total = total if isinstance(total, ColumnElement) else func.coalesce(ServiceTicket.total_price, 0)
+        services = services if isinstance(services, ColumnElement) else func.coalesce(ServiceTicket.service_count, 0)
+        ticket.total_price = func.round(total + price, 2)
+        ticket.service_count = services + count
+    else:
+        ticket.total_price = round((ticket.total_price or 0) + price, 2)
+        ticket.service_count = (ticket.service_count or 0) + count
+
+
+def _price(service_type):
+    # Loading an expired price must not autoflush a ticket that is still being built
+    session = object_session(service_type)
+    if session is None:
+        return service_type.price
+    with session.no_autoflush:
+        return service_type.price
+
+
+@event.listens_for(ServiceTicket.services, 'append')
+def _service_added(ticket, service_type, initiator):
+    _adjust_totals(ticket, _price(service_type), 1)
+
+
+@event.listens_for(ServiceTicket.services, 'remove')
+def _service_removed(ticket, service_type, initiator):
+    _adjust_totals(ticket, -_price(service_type), -1)
+
+
+def shift_ticket_totals(service_type_id, price, count=0):
+    # For changes that never pass through ServiceTicket.services: a price edit, or a service
+    # type being deleted, whose ticket_service rows go without any collection event
+    linked = select(ticket_service.c.service_ticket_id).where(ticket_service.c.service_type_id == service_type_id)
+    return (update(ServiceTicket.__table__)
+            .where(ServiceTicket.id.in_(linked))
+            .values(total_price=func.round(func.coalesce(ServiceTicket.total_price, 0) + price, 2),
+                    service_count=func.coalesce(ServiceTicket.service_count, 0) + count,
+                    updated_at=utcnow()))
+
+
+def _stored_totals():
+    links = ticket_service.c.service_ticket_id == ServiceTicket.id
+    total = (select(func.round(func.coalesce(func.sum(ServiceType.price), 0), 2))
+             .select_from(ticket_service.join(ServiceType)).where(links).scalar_subquery())
+    count = select(func.count()).select_from(ticket_service).where(links).scalar_subquery()
+    return total, count
+
+
+def repair_ticket_totals(bind=None, chunk_size=10_000, dry_run=False):
+    # Recomputes total_price/service_count from ticket_service for tickets whose stored values
+    # drifted (or were never set), one id range per transaction; returns (id, customer_id) of those that were off
+    bind = bind or db.engine
+    total, count = _stored_totals()
+    drifted = or_(ServiceTicket.total_price.is_(None), ServiceTicket.service_count.is_(None),
+                  ServiceTicket.service_count != count, func.abs(ServiceTicket.total_price - total) > 0.005)
+    with bind.connect() as conn:
+        low, high = conn.execute(select(func.min(ServiceTicket.id), func.max(ServiceTicket.id))).one()
+    if low is None:
+        return []
+
+    fixed = []
+    for start in range(low, high + 1, chunk_size):
+        in_chunk = ServiceTicket.id.between(start, start + chunk_size - 1)
+        with bind.begin() as conn:
+            rows = conn.execute(select(ServiceTicket.id, ServiceTicket.customer_id).where(in_chunk, drifted)).all()
+            if rows and not dry_run:
+                conn.execute(update(ServiceTicket.__table__).where(ServiceTicket.id.in_([row.id for row in rows]))
+                             .values(total_price=total, service_count=count, updated_at=utcnow()))
+            fixed += rows
+    return fixed
+
+
+def create_missing_columns(bind=None):
+    # create_all() never alters existing tables, so nullable columns declared later are added here
+    bind = bind or db.engine
+    added = []
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspect(bind).get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                spec = CreateColumn(column).compile(dialect=bind.dialect)
+                with bind.begin() as conn:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {spec}')
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def create_missing_indexes(bind=None):
+    # create_all() skips indexes on tables that already exist, so databases created
+    # before an index was declared are brought up to date here
+    bind = bind or db.engine
+    created = []
+    for table in Base.metadata.sorted_tables:
+        existing = {ix['name'] for ix in inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind)
+                created.append(index.name)
+    return created
\ No newline at end of file
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import logging
+import uuid
+from datetime import timezone
+from functools import wraps
+from blinker import Namespace
+from flask import request, make_response, current_app, has_app_context
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.orm import Session
+from flask_caching.backends import SimpleCache, FileSystemCache, RedisCache
+from app.extensions import cache
+from app.utils.replica import primary
+from app.models import db, Car, Customer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENTITY_TIMEOUT = 60 * 60
+DEFAULT_MAX_ENTRY_BYTES = 512 * 1024
+
+# Sent with hit=True/False on every entity cache lookup; free when nothing is connected
+cache_lookup = Namespace().signal('cache-lookup')
+
+# Writes to a child row also change what its parent's detail endpoints return
+_parents = {
+    Car: [(Customer, 'customer_id')],
+}
+
+
+class JSONSerializer:
+    # Drop-in for cachelib's pickle serializers; plain integers stay readable by Redis INCR
+    def dumps(self, value):
+        return json.dumps(value).encode()
+
+    def loads(self, value):
+        return None if value is None else json.loads(value)
+
+    def dump(self, value, f):
+        f.write(self.dumps(value))
+
+    def load(self, f):
+        return self.loads(f.read())
+
+
+class JSONSimpleCache(SimpleCache):
+    serializer = JSONSerializer()
+
+
+class JSONFileSystemCache(FileSystemCache):
+    serializer = JSONSerializer()
+
+
+class JSONRedisCache(RedisCache):
+    serializer = JSONSerializer()
+
+
+_json_backends = {
+    'SimpleCache': JSONSimpleCache,
+    'FileSystemCache': JSONFileSystemCache,
+    'RedisCache': JSONRedisCache,
+}
+
+
+def cache_config(app):
+    # The serializer has to be chosen before the backend is built since some backends write on init
+    backend = app.config.get('CACHE_TYPE', 'SimpleCache')
+    if app.config.get('CACHE_SERIALIZER', 'pickle') == 'json' and backend in _json_backends:
+        json_backend = _json_backends[backend]
+        return {'CACHE_TYPE': f'{json_backend.__module__}.{json_backend.__name__}'}
+    return {}
+
+
+def warn_process_local_cache(app):
+    # Under gunicorn every worker gets its own SimpleCache and invalidation reaches only the writer's
+    if not (app.debug or app.testing) and app.config.get('CACHE_TYPE', 'SimpleCache') == 'SimpleCache':
+        logger.warning('CACHE_TYPE is SimpleCache: each worker caches separately and may serve writes '
+                       'from other workers up to ENTITY_CACHE_TIMEOUT (%ss) late; set CACHE_REDIS_URL',
+                       app.config.get('ENTITY_CACHE_TIMEOUT', DEFAULT_ENTITY_TIMEOUT))
+
+
+def _version_key(table, ident=None):
+    return f'version:{table}' if ident is None else f'version:{table}:{ident}'
+
+
+def _entity_timeout():
+    return current_app.config.get('ENTITY_CACHE_TIMEOUT', DEFAULT_ENTITY_TIMEOUT)
+
+
+def _versions(keys):
+    versions = cache.get_many(*keys)
+    missing = {key: uuid.uuid4().hex for key, version in zip(keys, versions) if version is None}
+    if missing:
+        # A version token that expires only orphans the entries built on it, so it never needs to outlive them
+        cache.set_many(missing, timeout=_entity_timeout())
+    return [version or missing[key] for key, version in zip(keys, versions)]
+
+
+def entity_cache_key(model, ident, depends_on=()):
+    table = model.__tablename__
+    keys = [_version_key(table, ident)] + [_version_key(dep.__tablename__) for dep in depends_on]
+    return f'entity:{table}:{ident}:{":".join(_versions(keys))}:{request.full_path}'
+
+
+def invalidate(model, ident):
+    # delete_many stops at the first missing key on some backends, so delete one at a time
+    cache.delete(_version_key(model.__tablename__, ident))
+    cache.delete(_version_key(model.__tablename__))
+
+
+def cached_entity(model, id_arg='id', depends_on=(), timeout=None):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = entity_cache_key(model, kwargs[id_arg], depends_on)
+            cached = cache.get(key)
+            cache_lookup.send(current_app._get_current_object(), hit=cached is not None)
+            if cached is not None:
+                body, status, mimetype = cached
+                return current_app.response_class(body, status=status, mimetype=mimetype)
+
+            # Entries outlive any replica lag, so they are always built from the primary
+            with primary():
+                response = make_response(f(*args, **kwargs))
+            body = response.get_data(as_text=True)
+            max_bytes = current_app.config.get('CACHE_MAX_ENTRY_BYTES', DEFAULT_MAX_ENTRY_BYTES)
+            if response.status_code == 200 and len(body.encode()) <= max_bytes:
+                cache.set(key, (body, response.status_code, response.mimetype), timeout=timeout or _entity_timeout())
+            return response
+
+        return decorated
+
+    return decorator
+
+
+def _children(model):
+    return [(child, fk) for child, parents in _parents.items() for parent, fk in parents if parent is model]
+
+
+def _state(model, *criteria):
+    return (select(func.max(model.updated_at)).where(*criteria).scalar_subquery(),
+            select(func.count()).select_from(model).where(*criteria).scalar_subquery())
+
+
+def validators(model, ident=None, depends_on=()):
+    # (max updated_at, count) for the row or table plus everything its representation embeds, in one round trip
+    if ident is None:
+        states = [_state(model)] + [_state(child) for child, _ in _children(model)]
+    else:
+        states = [_state(model, model.id == ident)]
+        states += [_state(child, getattr(child, fk) == ident) for child, fk in _children(model)]
+    states += [_state(dep) for dep in depends_on]
+    return tuple(db.session.execute(select(*[column for state in states for column in state])).one())
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+
+def conditional(model, id_arg=None, depends_on=()):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            state = validators(model, kwargs[id_arg] if id_arg else None, depends_on)
+            if id_arg and not state[1]:
+                return f(*args, **kwargs)
+
+            stamps = [stamp for stamp in state[0::2] if stamp is not None]
+            last_modified = max(stamps) if stamps else None
+            # The query string is part of the tag since ?fields= and paging change the body
+            etag = hashlib.sha1(f'{request.full_path}|{state}'.encode()).hexdigest()
+
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            return response
+
+        return decorated
+
+    return decorator
+
+
+def _identities(obj):
+    model = type(obj)
+    state = inspect(obj)
+    ident = state.mapper.primary_key_from_instance(obj)[0]
+    if ident is None:
+        return []
+
+    identities = [(model, ident)]
+    for parent, fk in _parents.get(model, []):
+        # Includes the previous value when a row moved to another parent
+        for value in state.attrs[fk].history.sum() or [state.dict.get(fk)]:
+            if value is not None:
+                identities.append((parent, value))
+    return identities
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_written_entities(session, flush_context):
+    pending = session.info.setdefault('cache_invalidations', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        pending.update(_identities(obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_written_entities(session):
+    pending = session.info.pop('cache_invalidations', set())
+    if not pending or not has_app_context():
+        return
+    for model, ident in pending:
+        invalidate(model, ident)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_written_entities(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('cache_invalidations', None)
@@ -0,0 +1,98 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from app.models import db
+from app.utils.replica import replica_engine
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that also records how long checkouts wait for a free connection
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+
+def pool_stats(engine=None):
+    pool = (engine or db.engine).pool
+    if not isinstance(pool, QueuePool):
+        return {}
+
+    stats = {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        # QueuePool reports overflow relative to pool_size, negative while the pool is still filling
+        'overflow': max(pool.overflow(), 0),
+    }
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            'peak_checked_out': pool.peak_checked_out,
+            'checkouts': pool.checkouts,
+            'timeouts': pool.timeouts,
+            'wait_seconds_total': pool.wait_total,
+            'wait_seconds_max': pool.wait_max,
+        })
+    return stats
+
+
+def configure_pool(app):
+    # Copied rather than updated in place: the dicts belong to the config class and are shared by every app
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    if 'pool_size' in options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': InstrumentedQueuePool, **options}
+
+    replica_options = app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS') or {}
+    if 'pool_size' in replica_options:
+        app.config['SQLALCHEMY_REPLICA_ENGINE_OPTIONS'] = {'poolclass': InstrumentedQueuePool, **replica_options}
+
+
+_timeout_statements = {
+    'mysql': 'SET SESSION max_execution_time = {ms}',
+    'postgresql': 'SET statement_timeout = {ms}',
+}
+
+
+def apply_statement_timeout(app):
+    ms = app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    if not ms:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values()) + [e for e in [replica_engine(app)] if e is not None]
+    for engine in engines:
+        statement = _timeout_statements.get(engine.dialect.name)
+        if statement is not None:
+            event.listen(engine, 'connect', _timeout_setter(statement.format(ms=int(ms))))
+
+
+def _timeout_setter(statement):
+    def set_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+    return set_timeout
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from flask import Response, current_app, stream_with_context
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def get_export_format(args):
+    fmt = args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        raise ExportError(f'format must be one of: {", ".join(FORMATS)}')
+    return fmt
+
+
+def _plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_lines(records):
+    for record in records:
+        yield json.dumps({k: _plain(v) for k, v in record.items()}) + '\n'
+
+
+def _csv_lines(columns, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(columns)
+    yield flush()
+    for record in records:
+        writer.writerow([';'.join(map(str, v)) if isinstance(v, list) else _plain(v) for v in record.values()])
+        yield flush()
+
+
+def stream_rows(session, stmt):
+    # Server-side cursor: rows are fetched in yield_per batches instead of being buffered up front
+    chunk = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+    result = session.execute(stmt.execution_options(stream_results=True, yield_per=chunk))
+    for partition in result.partitions():
+        yield partition
+
+
+def export_response(fmt, columns, records, filename):
+    lines = _ndjson_lines(records) if fmt == 'ndjson' else _csv_lines(columns, records)
+    return Response(
+        stream_with_context(lines),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'}
+    )
@@ -0,0 +1,193 @@
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import g, request, jsonify, has_app_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from app.models import db
+from app.utils.caching import cache_lookup
+from app.utils.db_pool import pool_stats
+from app.utils.replica import replica_engine
+from app.utils.util import admin_required
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_QUERY_MS = 200
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metrics:
+    # Per-process counters; each gunicorn worker serves its own /metrics
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(lambda: {'count': 0, 'wall': 0.0, 'db': 0.0, 'queries': 0,
+                                             'serialize': 0.0, 'buckets': [0] * len(BUCKETS)})
+        self.cache = defaultdict(int)
+        self.slow_queries = 0
+
+    def observe(self, labels, perf, wall):
+        with self.lock:
+            entry = self.requests[labels]
+            entry['count'] += 1
+            entry['wall'] += wall
+            entry['db'] += perf['db']
+            entry['queries'] += perf['queries']
+            entry['serialize'] += perf['serialize']
+            for i, bound in enumerate(BUCKETS):
+                if wall <= bound:
+                    entry['buckets'][i] += 1
+            for endpoint, hit in perf['cache']:
+                self.cache[(endpoint, 'hit' if hit else 'miss')] += 1
+
+    def render(self, pools):
+        # Nothing is shared between workers: scrape each one (or sum them) rather than reading one as the total
+        lines = [f'# Counters for worker process {os.getpid()} only']
+
+        def metric(name, kind, help_text, samples):
+            if not samples:
+                return
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{name}{suffix}{{{label_text}}} {value}' if label_text else f'{name}{suffix} {value}')
+
+        with self.lock:
+            requests = [(tuple(zip(('endpoint', 'method', 'status'), labels)), dict(entry, buckets=list(entry['buckets'])))
+                        for labels, entry in sorted(self.requests.items())]
+            cache = sorted(self.cache.items())
+            slow_queries = self.slow_queries
+
+        metric('http_requests_total', 'counter', 'Requests served.',
+               [('', labels, e['count']) for labels, e in requests])
+        histogram = []
+        for labels, e in requests:
+            histogram += [('_bucket', labels + (('le', bound),), e['buckets'][i]) for i, bound in enumerate(BUCKETS)]
+            histogram += [('_bucket', labels + (('le', '+Inf'),), e['count']),
+                          ('_sum', labels, round(e['wall'], 6)), ('_count', labels, e['count'])]
+        metric('http_request_duration_seconds', 'histogram', 'Wall time per request.', histogram)
+        metric('http_request_db_seconds_total', 'counter', 'Time spent executing SQL.',
+               [('', labels, round(e['db'], 6)) for labels, e in requests])
+        metric('http_request_db_queries_total', 'counter', 'SQL statements executed.',
+               [('', labels, e['queries']) for labels, e in requests])
+        metric('http_request_serialization_seconds_total', 'counter', 'Time spent dumping list pages and encoding responses.',
+               [('', labels, round(e['serialize'], 6)) for labels, e in requests])
+        metric('cache_lookups_total', 'counter', 'Entity cache lookups.',
+               [('', (('endpoint', endpoint), ('result', result)), count) for (endpoint, result), count in cache])
+        metric('db_slow_queries_total', 'counter', 'Statements slower than SLOW_QUERY_MS.', [('', (), slow_queries)])
+        for stat in ('checked_out', 'overflow', 'size'):
+            metric(f'db_pool_{stat}', 'gauge', f'Connection pool {stat.replace("_", " ")}.',
+                   [('', (('engine', name),), stats[stat]) for name, stats in pools if stat in stats])
+        metric('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a pooled connection.',
+               [('', (('engine', name),), round(stats['wait_seconds_total'], 6))
+                for name, stats in pools if 'wait_seconds_total' in stats])
+        metric('db_pool_timeouts_total', 'counter', 'Checkouts that gave up after pool_timeout.',
+               [('', (('engine', name),), stats['timeouts']) for name, stats in pools if 'timeouts' in stats])
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed_serialization():
+    # Adds to the current request's serialize time; a no-op outside instrumented requests
+    perf = g.get('perf') if has_app_context() else None
+    # Nested timers are counted once, by the outermost
+    if perf is None or perf['depth']:
+        yield
+        return
+    perf['depth'] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        perf['serialize'] += time.perf_counter() - start
+        perf['depth'] -= 1
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with timed_serialization():
+            return super().dumps(obj, **kwargs)
+
+
+def _instrument_engine(engine, app, metrics):
+    slow_seconds = app.config.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS) / 1000
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perf_query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['perf_query_start'].pop()
+        perf = g.get('perf') if has_app_context() else None
+        if perf is not None:
+            perf['db'] += elapsed
+            perf['queries'] += 1
+        if elapsed >= slow_seconds:
+            with metrics.lock:
+                metrics.slow_queries += 1
+            logger.warning('Slow query (%.1f ms) on %s: %s', elapsed * 1000, engine.url.render_as_string(), statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def _server_timing(perf, wall):
+    parts = [f'app;dur={wall * 1000:.1f}',
+             f'db;dur={perf["db"] * 1000:.1f};desc="{perf["queries"]} queries"',
+             f'serialize;dur={perf["serialize"] * 1000:.1f}']
+    if perf['cache']:
+        parts.append(f'cache;desc="{"hit" if all(hit for _, hit in perf["cache"]) else "miss"}"')
+    return ', '.join(parts)
+
+
+def init_instrumentation(app):
+    if not app.config.get('PERF_INSTRUMENTATION'):
+        return
+
+    metrics = app.extensions['perf_metrics'] = Metrics()
+    with app.app_context():
+        engines = {'primary': db.engine}
+    if replica_engine(app) is not None:
+        engines['replica'] = replica_engine(app)
+    for engine in engines.values():
+        _instrument_engine(engine, app, metrics)
+
+    app.json = TimedJSONProvider(app)
+
+    @cache_lookup.connect_via(app)
+    def _count_cache_lookup(sender, hit):
+        perf = g.get('perf')
+        if perf is not None:
+            perf['cache'].append((request.endpoint, hit))
+
+    @app.before_request
+    def _start_timer():
+        g.perf = {'start': time.perf_counter(), 'db': 0.0, 'queries': 0, 'serialize': 0.0, 'depth': 0, 'cache': []}
+
+    @app.after_request
+    def _record_request(response):
+        perf = g.pop('perf', None)
+        if perf is None:
+            return response
+        wall = time.perf_counter() - perf['start']
+        response.headers['Server-Timing'] = _server_timing(perf, wall)
+        metrics.observe((request.endpoint or 'unmatched', request.method, response.status_code), perf, wall)
+        return response
+
+    def metrics_endpoint():
+        pools = [(name, pool_stats(engine)) for name, engine in engines.items()]
+        return app.response_class(metrics.render(pools), mimetype='text/plain; version=0.0.4')
+
+    token = app.config.get('METRICS_TOKEN')
+
+    def scrape_with_token():
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'message': 'Invalid metrics token'}), 401
+        return metrics_endpoint()
+
+    # Scrapers send METRICS_TOKEN as a bearer token; without one configured only mechanics may read it
+    app.add_url_rule('/metrics', 'metrics', scrape_with_token if token else admin_required(metrics_endpoint))
@@ -0,0 +1,137 @@
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from urllib import request as urlrequest
+from flask import current_app
+from sqlalchemy import select, update
+from app.models import db, OutboxMessage
+
+SISTER_SITE_TOPIC = 'sister_site.ticket'
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(topic, payload):
+    # Added to the caller's session so the message commits or rolls back with the ticket
+    now = _now()
+    message = OutboxMessage(topic=topic, payload=payload, created_at=now, next_attempt_at=now, attempts=0)
+    db.session.add(message)
+    return message
+
+
+def post_to_sister_site(messages):
+    body = json.dumps({'tickets': [m.payload for m in messages]}).encode()
+    req = urlrequest.Request(
+        current_app.config['SISTER_SITE_URL'],
+        data=body,
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    with urlrequest.urlopen(req, timeout=current_app.config.get('SISTER_SITE_TIMEOUT', 5)) as response:
+        response.read()
+
+
+def _bury(message, now):
+    message.dead_at = now
+    logger.error('Outbox message %s (%s) dead after %s attempts: %s',
+                 message.id, message.topic, message.attempts, message.last_error)
+
+
+def dead_letters(topic=SISTER_SITE_TOPIC):
+    return db.session.execute(
+        select(OutboxMessage).where(OutboxMessage.topic == topic, OutboxMessage.dead_at.is_not(None))
+        .order_by(OutboxMessage.id)
+    ).scalars().all()
+
+
+def retry_dead_letters(topic=SISTER_SITE_TOPIC):
+    now = _now()
+    result = db.session.execute(
+        update(OutboxMessage).where(OutboxMessage.topic == topic, OutboxMessage.dead_at.is_not(None))
+        .values(dead_at=None, attempts=0, next_attempt_at=now)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def dispatch_batch(send=post_to_sister_site, topic=SISTER_SITE_TOPIC):
+    # Returns (processed, delivered): a batch that failed or was dead-lettered still processed messages
+    config = current_app.config
+    batch_size = config.get('OUTBOX_BATCH_SIZE', 50)
+    max_attempts = config.get('OUTBOX_MAX_ATTEMPTS', 8)
+    now = _now()
+
+    query = (
+        select(OutboxMessage)
+        .where(
+            OutboxMessage.topic == topic,
+            OutboxMessage.delivered_at.is_(None),
+            OutboxMessage.dead_at.is_(None),
+            OutboxMessage.next_attempt_at <= now
+        )
+        .order_by(OutboxMessage.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    messages = db.session.execute(query).scalars().all()
+    processed = len(messages)
+    # Rows that used up their attempts before dead_at existed, or under a higher OUTBOX_MAX_ATTEMPTS
+    for message in [m for m in messages if m.attempts >= max_attempts]:
+        _bury(message, now)
+        messages.remove(message)
+    if not messages:
+        db.session.commit()
+        return processed, 0
+
+    try:
+        send(messages)
+    except Exception as e:
+        for message in messages:
+            message.attempts += 1
+            # Exponential backoff, capped so a long outage still retries every OUTBOX_MAX_BACKOFF seconds
+            delay = min(config.get('OUTBOX_BACKOFF_SECONDS', 5) * 2 ** (message.attempts - 1),
+                        config.get('OUTBOX_MAX_BACKOFF', 15 * 60))
+            message.next_attempt_at = now + timedelta(seconds=delay)
+            message.last_error = str(e)[:500]
+            if message.attempts >= max_attempts:
+                _bury(message, now)
+        db.session.commit()
+        return processed, 0
+
+    for message in messages:
+        message.attempts += 1
+        message.delivered_at = now
+    db.session.commit()
+    return processed, len(messages)
+
+
+def run_worker(once=False, send=post_to_sister_site):
+    config = current_app.config
+    interval = config.get('OUTBOX_POLL_INTERVAL', 2)
+    total = 0
+    failures = 0
+    while True:
+        try:
+            processed, delivered = dispatch_batch(send)
+        except Exception:
+            # e.g. the database restarting; the batch's row locks go with the rollback
+            db.session.rollback()
+            if once:
+                raise
+            failures += 1
+            delay = min(interval * 2 ** failures, config.get('OUTBOX_MAX_BACKOFF', 15 * 60))
+            logger.exception('Outbox dispatch failed, retrying in %ss', delay)
+            time.sleep(delay)
+            continue
+        failures = 0
+        total += delivered
+        # Drain a backlog back-to-back, failures included, and only sleep once nothing is due
+        if not processed:
+            if once:
+                return total
+            time.sleep(interval)
@@ -0,0 +1,163 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from flask import request, current_app
+from sqlalchemy import select, func, or_, and_
+from app.models import db
+from app.utils.serializers import RowSerializer, get_fields
+from app.utils.instrumentation import timed_serialization
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 100
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def get_page_args():
+    max_per_page = current_app.config.get('MAX_PER_PAGE', MAX_PER_PAGE)
+
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', DEFAULT_PER_PAGE))
+    except ValueError:
+        raise PaginationError('page and per_page must be integers')
+
+    if page < 1:
+        raise PaginationError('page must be 1 or greater')
+    if per_page < 1 or per_page > max_per_page:
+        raise PaginationError(f'per_page must be between 1 and {max_per_page}')
+
+    return page, per_page
+
+
+def count_rows(stmt):
+    # COUNT(*) over the filtered statement so only a single integer leaves the database
+    count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+    return db.session.execute(count_stmt).scalar_one()
+
+
+def encode_cursor(sort, value, last_id):
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, last_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort, value, last_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+
+    if type(last_id) is not int:
+        raise PaginationError('Invalid cursor')
+    return sort, value, last_id
+
+
+def _coerce(column, value):
+    # A forged cursor can carry any JSON value; only one of the column's own type may reach the seek
+    python_type = column.type.python_type
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PaginationError('Invalid cursor')
+    if python_type is float and type(value) is int:
+        return float(value)
+    if type(value) is not python_type:
+        raise PaginationError('Invalid cursor')
+    return value
+
+
+def get_sort_column(model, sort_keys):
+    sort = request.args.get('sort', 'id')
+    if sort == 'id':
+        return sort, model.id
+    if not sort_keys or sort not in sort_keys:
+        allowed = ', '.join(['id'] + sorted(sort_keys or {}))
+        raise PaginationError(f'sort must be one of: {allowed}')
+    return sort, sort_keys[sort]
+
+
+def _next_cursor(items, sort, column):
+    last = items[-1]
+    return encode_cursor(sort, getattr(last, column.key), last.id)
+
+
+def _fetch(stmt, schema):
+    if isinstance(schema, RowSerializer):
+        return db.session.execute(schema.project(stmt)).all()
+    return db.session.execute(stmt).scalars().all()
+
+
+def paginate(stmt, model, schema, key, total_key=None, sort_keys=None):
+    sort, column = get_sort_column(model, sort_keys)
+    if isinstance(schema, RowSerializer):
+        schema = schema.narrow(get_fields(schema.field_names), keep=(column,))
+    order = [model.id] if sort == 'id' else [column, model.id]
+
+    if 'cursor' in request.args or 'after_id' in request.args:
+        return _paginate_keyset(stmt.order_by(*order), model, schema, key, sort, column)
+
+    page, per_page = get_page_args()
+    total = count_rows(stmt)
+
+    items = _fetch(stmt.order_by(*order).offset((page - 1) * per_page).limit(per_page), schema)
+
+    with timed_serialization():
+        page_items = schema.dump(items)
+
+    envelope = {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': (total + per_page - 1) // per_page,
+        'next_cursor': _next_cursor(items, sort, column) if items and page * per_page < total else None,
+        key: page_items
+    }
+    if total_key:
+        envelope[total_key] = total
+
+    return envelope
+
+
+def _paginate_keyset(stmt, model, schema, key, sort, column):
+    _, per_page = get_page_args()
+
+    if 'cursor' in request.args:
+        cursor_sort, value, last_id = decode_cursor(request.args['cursor'])
+        if cursor_sort != sort:
+            raise PaginationError('cursor was issued for a different sort')
+    else:
+        if sort != 'id':
+            raise PaginationError('after_id can only be used with the default id sort')
+        try:
+            value = last_id = int(request.args['after_id'])
+        except ValueError:
+            raise PaginationError('after_id must be an integer')
+
+    # Seek past the last row seen instead of OFFSET so every page costs the same as the first
+    if sort == 'id':
+        stmt = stmt.where(model.id > last_id)
+    else:
+        value = _coerce(column, value)
+        stmt = stmt.where(or_(column > value, and_(column == value, model.id > last_id)))
+
+    rows = _fetch(stmt.limit(per_page + 1), schema)
+    items = rows[:per_page]
+
+    with timed_serialization():
+        page_items = schema.dump(items)
+
+    return {
+        'per_page': per_page,
+        'sort': sort,
+        'next_cursor': _next_cursor(items, sort, column) if len(rows) > per_page else None,
+        key: page_items
+    }
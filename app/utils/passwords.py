@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+DEFAULT_TIMEOUT = 10
+
+_pool = None
+_pool_pid = None
+_slots = None
+_lock = threading.Lock()
+
+
+class HashingBusyError(RuntimeError):
+    pass
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid, _slots
+    # Built lazily and per pid so every forked gunicorn worker gets its own pool
+    if _pool is None or _pool_pid != os.getpid():
+        with _lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=workers)
+                _pool_pid = os.getpid()
+                _slots = threading.BoundedSemaphore(workers * current_app.config.get('PASSWORD_HASH_QUEUE', 4))
+    return _pool
+
+
+def _reset_pool(pool):
+    # A worker died or the pool was shut down; the next caller builds a fresh one
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if not workers:
+        return fn(*args)
+
+    pool = _get_pool(workers)
+    slots = _slots
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT', DEFAULT_TIMEOUT)
+    if not slots.acquire(timeout=timeout):
+        raise HashingBusyError('Too many password hashes in flight')
+    try:
+        future = pool.submit(fn, *args)
+    except RuntimeError:
+        slots.release()
+        _reset_pool(pool)
+        raise HashingBusyError('Password hashing pool is unavailable')
+    # The slot stays taken until the hash really finishes, not just until this request stops waiting
+    future.add_done_callback(lambda _: slots.release())
+
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        raise HashingBusyError('Password hash timed out')
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        raise HashingBusyError('Password hashing pool is unavailable')
+
+
+def _method():
+    return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug fills in default parameters, so "scrypt" is stored as "scrypt:32768:8:1"
+    return generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _method())
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    return pwhash.split('$', 1)[0] != _method_prefix(_method())
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+STICKY_COOKIE = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+logger = logging.getLogger(__name__)
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def _mysql_lag(conn):
+    for statement, column in (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                              ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')):
+        try:
+            status = conn.exec_driver_sql(statement).mappings().first()
+        except Exception:
+            continue
+        if status is None:
+            return 0
+        # NULL means the replication threads are stopped
+        lag = status.get(column)
+        return float('inf') if lag is None else float(lag)
+    return 0
+
+
+def _postgresql_lag(conn):
+    return conn.exec_driver_sql(
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    ).scalar()
+
+
+_lag_probes = {
+    'mysql': _mysql_lag,
+    'postgresql': _postgresql_lag,
+}
+
+
+def _replica_healthy(engine):
+    config = current_app.config
+    now = time.monotonic()
+    checked_at, healthy = _health.get(engine, (None, False))
+    if checked_at is not None and now - checked_at < config.get('REPLICA_LAG_CHECK_SECONDS', 1):
+        return healthy
+
+    with _health_lock:
+        checked_at, healthy = _health.get(engine, (None, False))
+        if checked_at is not None and now - checked_at < config.get('REPLICA_LAG_CHECK_SECONDS', 1):
+            return healthy
+        probe = config.get('REPLICA_LAG_PROBE') or _lag_probes.get(engine.dialect.name, lambda conn: 0)
+        try:
+            with engine.connect() as conn:
+                lag = probe(conn)
+            healthy = lag <= config.get('REPLICA_MAX_LAG_SECONDS', 5)
+            if not healthy:
+                logger.warning('Replica is %ss behind, reading from the primary', lag)
+        except Exception:
+            logger.exception('Replica lag check failed, reading from the primary')
+            healthy = False
+        _health[engine] = (now, healthy)
+    return healthy
+
+
+def _sticky_to_primary():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def replica_engine(app=None):
+    return (app or current_app).extensions.get('replica_engine')
+
+
+def _route_to_replica():
+    if not has_request_context() or request.method not in READ_METHODS or g.get('db_primary'):
+        return None
+    replica = replica_engine()
+    if replica is None or _sticky_to_primary():
+        return None
+    if 'replica_healthy' not in g:
+        g.replica_healthy = _replica_healthy(replica)
+    return replica if g.replica_healthy else None
+
+
+class RoutingSession(Session):
+    # Reads in GET/HEAD requests go to the replica engine when one is configured, healthy and
+    # not too far behind; flushes and anything after a write in the same session stay on the primary
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not self.info.get('wrote'):
+            replica = _route_to_replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.info['wrote'] = True
+
+
+@contextmanager
+def primary():
+    # Forces reads onto the primary, e.g. while filling a cache that outlives the replica's lag
+    previous = g.get('db_primary', False)
+    g.db_primary = True
+    try:
+        yield
+    finally:
+        g.db_primary = previous
+
+
+def init_replica(app):
+    # A plain engine rather than a Flask-SQLAlchemy bind: binds get their own metadata, and every model
+    # here lives on the primary's
+    uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if not uri:
+        return
+    app.extensions['replica_engine'] = create_engine(uri, **(app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS') or {}))
+
+    @app.after_request
+    def _stick_writers_to_primary(response):
+        # Read-your-writes: a client that just wrote reads from the primary until the replica has caught up
+        if request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400:
+            window = app.config.get('REPLICA_STICKY_SECONDS', app.config.get('REPLICA_MAX_LAG_SECONDS', 5))
+            response.set_cookie(STICKY_COOKIE, str(time.time() + window), max_age=int(window) + 1, httponly=True)
+        return response
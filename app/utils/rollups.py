@@ -0,0 +1,185 @@
+from datetime import timedelta
+from sqlalchemy import event, inspect, select, insert, delete, func, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import db, ServiceTicket, ServiceType, Employee, ReportRollup, mechanic_ticket, ticket_service, utcnow
+from app.utils.replica import primary
+
+PERIODS = ('day', 'week', 'month')
+DAY_TOTAL = 0
+MATERIALIZE_ATTEMPTS = 3
+
+
+def period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def periods(start, end, period):
+    current = period_start(start, period)
+    while current <= end:
+        yield current
+        if period == 'month':
+            current = (current + timedelta(days=32)).replace(day=1)
+        else:
+            current += timedelta(days=7 if period == 'week' else 1)
+
+
+def _in_range(start, end):
+    return ServiceTicket.service_date.between(start, end)
+
+
+def _day_totals(start, end):
+    return (select(ServiceTicket.service_date, literal(DAY_TOTAL), func.count(),
+                   func.sum(func.coalesce(ServiceTicket.service_count, 0)),
+                   func.sum(func.coalesce(ServiceTicket.total_price, 0)))
+            .where(_in_range(start, end))
+            .group_by(ServiceTicket.service_date))
+
+
+def _by_service_type(start, end):
+    return (select(ServiceTicket.service_date, ticket_service.c.service_type_id, func.count(), func.count(),
+                   func.sum(ServiceType.price))
+            .join(ticket_service, ticket_service.c.service_ticket_id == ServiceTicket.id)
+            .join(ServiceType, ServiceType.id == ticket_service.c.service_type_id)
+            .where(_in_range(start, end))
+            .group_by(ServiceTicket.service_date, ticket_service.c.service_type_id))
+
+
+def _by_mechanic(start, end):
+    return (select(ServiceTicket.service_date, mechanic_ticket.c.employee_id, func.count(),
+                   func.sum(func.coalesce(ServiceTicket.service_count, 0)),
+                   func.sum(func.coalesce(ServiceTicket.total_price, 0)))
+            .join(mechanic_ticket, mechanic_ticket.c.service_ticket_id == ServiceTicket.id)
+            .where(_in_range(start, end))
+            .group_by(ServiceTicket.service_date, mechanic_ticket.c.employee_id))
+
+
+# Every report has a DAY_TOTAL row per day, so a day is materialized exactly when that row exists
+REPORTS = {
+    'revenue': (_day_totals, _by_service_type),
+    'mechanic_load': (_day_totals, _by_mechanic),
+}
+
+
+def _aggregate(report, start, end):
+    rows = []
+    for query in REPORTS[report]:
+        rows += [(day, subject, tickets, services or 0, round(amount or 0, 2))
+                 for day, subject, tickets, services, amount in db.session.execute(query(start, end))]
+    return rows
+
+
+def _missing_spans(report, start, end):
+    done = set(db.session.execute(
+        select(ReportRollup.day).where(ReportRollup.report == report, ReportRollup.subject_id == DAY_TOTAL,
+                                       ReportRollup.day.between(start, end))
+    ).scalars())
+    spans, span_start, day = [], None, start
+    while day <= end:
+        if day not in done and span_start is None:
+            span_start = day
+        elif day in done and span_start is not None:
+            spans.append((span_start, day - timedelta(days=1)))
+            span_start = None
+        day += timedelta(days=1)
+    if span_start is not None:
+        spans.append((span_start, end))
+    return spans
+
+
+def materialize(report, start, end):
+    # Only for days before today: GROUP BY over the raw tickets once, then served from report_rollup
+    with primary():
+        for _ in range(MATERIALIZE_ATTEMPTS):
+            written = 0
+            try:
+                for span_start, span_end in _missing_spans(report, start, end):
+                    rows = _aggregate(report, span_start, span_end)
+                    busy = {day for day, subject, *_ in rows if subject == DAY_TOTAL}
+                    day = span_start
+                    while day <= span_end:
+                        if day not in busy:
+                            rows.append((day, DAY_TOTAL, 0, 0, 0.0))
+                        day += timedelta(days=1)
+                    now = utcnow()
+                    db.session.execute(insert(ReportRollup), [
+                        {'report': report, 'day': day, 'subject_id': subject, 'tickets': tickets,
+                         'services': services, 'amount': amount, 'computed_at': now}
+                        for day, subject, tickets, services, amount in rows
+                    ])
+                    written += len(rows)
+                db.session.commit()
+                return written
+            except IntegrityError:
+                # Another request materialized some of the same days first; theirs are just as good,
+                # so look again for the days that are still missing
+                db.session.rollback()
+    return 0
+
+
+def report_rows(report, start, end):
+    # (day, subject_id, tickets, services, amount) for every day in range: rollups up to yesterday, live after
+    today = utcnow().date()
+    rows = []
+    complete_end = min(end, today - timedelta(days=1))
+    if start <= complete_end:
+        stmt = (select(ReportRollup.day, ReportRollup.subject_id, ReportRollup.tickets, ReportRollup.services,
+                       ReportRollup.amount)
+                .where(ReportRollup.report == report, ReportRollup.day.between(start, complete_end)))
+        if _missing_spans(report, start, complete_end):
+            with primary():
+                materialize(report, start, complete_end)
+                rows += db.session.execute(stmt).all()
+                # Days concurrent writers kept us from rolling up are computed live rather than read as empty
+                for span_start, span_end in _missing_spans(report, start, complete_end):
+                    rows += _aggregate(report, span_start, span_end)
+        else:
+            rows += db.session.execute(stmt).all()
+    if end >= today:
+        rows += _aggregate(report, max(start, today), end)
+    return rows
+
+
+def fold(rows, period):
+    totals = {}
+    for day, subject, tickets, services, amount in rows:
+        total = totals.setdefault((period_start(day, period), subject), [0, 0, 0.0])
+        total[0] += tickets
+        total[1] += services
+        total[2] += amount
+    return totals
+
+
+def invalidate_rollups(conn, days=None):
+    # days=None drops every report's rollups, e.g. after a price change or a bulk load
+    stmt = delete(ReportRollup.__table__)
+    if days is not None:
+        stmt = stmt.where(ReportRollup.day.in_(sorted(days)))
+    conn.execute(stmt)
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_written_days(session, flush_context):
+    days, everything = set(), False
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ServiceTicket):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            # Includes the old date when a ticket moved to another day
+            written = [day for day in inspect(obj).attrs.service_date.history.sum() if day is not None]
+            days.update(written)
+            everything = everything or not written
+        elif isinstance(obj, ServiceType) and obj not in session.new:
+            everything = everything or obj in session.deleted or inspect(obj).attrs.price.history.has_changes()
+        elif isinstance(obj, Employee) and obj in session.deleted:
+            # Its mechanic_ticket rows go without any ticket being written
+            everything = True
+
+    today = utcnow().date()
+    days = {day for day in days if day < today}
+    if everything or days:
+        invalidate_rollups(session.connection(), None if everything else days)
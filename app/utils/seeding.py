@@ -0,0 +1,193 @@
+import random
+import time
+from array import array
+from datetime import date, timedelta
+from sqlalchemy import func, insert, select
+from app.models import Customer, Car, Employee, ServiceTicket, ServiceType, mechanic_ticket, ticket_service, utcnow
+
+SERVICE_TYPES = [
+    {"name": "Oil Change", "price": 29.99},
+    {"name": "Tire Rotation", "price": 49.99},
+    {"name": "Brake Inspection", "price": 39.99}
+]
+EXTRA_SERVICE_TYPES = [
+    {"name": "Wheel Alignment", "price": 89.99},
+    {"name": "Battery Replacement", "price": 149.99},
+    {"name": "Transmission Flush", "price": 129.99},
+    {"name": "Coolant Flush", "price": 99.99},
+    {"name": "Spark Plug Replacement", "price": 119.99},
+    {"name": "A/C Recharge", "price": 159.99},
+    {"name": "Engine Diagnostic", "price": 79.99},
+    {"name": "Brake Pad Replacement", "price": 189.99}
+]
+MAKES = {
+    'Toyota': ['Camry', 'Corolla', 'RAV4', 'Tacoma'],
+    'Honda': ['Civic', 'Accord', 'CR-V', 'Pilot'],
+    'Ford': ['F-150', 'Focus', 'Escape', 'Mustang'],
+    'Chevrolet': ['Silverado', 'Malibu', 'Equinox'],
+    'Nissan': ['Altima', 'Sentra', 'Rogue'],
+    'Subaru': ['Outback', 'Forester', 'Impreza'],
+}
+COLORS = ['Black', 'White', 'Gray', 'Silver', 'Blue', 'Red']
+ISSUES = ['Grinding noise when braking', 'Check engine light', 'Oil leak', 'Battery drains overnight',
+          'Pulls to the left', 'Rough idle', 'A/C blows warm', 'Scheduled maintenance']
+START_DATE = date(2024, 1, 1)
+DAYS = 730
+
+
+class SeedError(ValueError):
+    pass
+
+
+def vin(car_id):
+    return f'VIN{car_id:014d}'
+
+
+def _next_id(conn, model):
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield range(start, min(start + size, total))
+
+
+class Seeder:
+    # Rows are generated chunk by chunk with ids assigned up front, so association rows never
+    # wait on RETURNING and memory stays flat however many tickets are requested
+
+    def __init__(self, engine, seed=0, chunk_size=5000, password_hash='x', progress=None):
+        self.engine = engine
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.password_hash = password_hash
+        self.progress = progress or (lambda label, done, total: None)
+        self.counts = {}
+        self.seconds = {}
+
+    def _write(self, table, rows, conn, **values):
+        if not rows:
+            return
+        start = time.perf_counter()
+        stmt = insert(table).values(**values) if values else insert(table)
+        conn.execute(stmt, rows)
+        name = getattr(table, '__table__', table).name
+        self.counts[name] = self.counts.get(name, 0) + len(rows)
+        self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def _batches(self, label, total, make_rows):
+        # One transaction per chunk keeps undo logs and lock lists bounded on the server
+        for ids in _chunks(total, self.chunk_size):
+            with self.engine.begin() as conn:
+                make_rows(conn, ids)
+            self.progress(label, ids.stop, total)
+
+    def service_types(self, count):
+        with self.engine.begin() as conn:
+            existing = set(conn.execute(select(ServiceType.name)).scalars())
+            catalogue = SERVICE_TYPES + EXTRA_SERVICE_TYPES
+            catalogue += [{'name': f'Service {i}', 'price': 25 + i % 40 * 5} for i in range(len(catalogue), count)]
+            self._write(ServiceType, [st for st in catalogue[:count] if st['name'] not in existing], conn,
+                        updated_at=utcnow())
+            return dict(conn.execute(select(ServiceType.id, ServiceType.price)).all())
+
+    def customers(self, count):
+        with self.engine.connect() as conn:
+            first = _next_id(conn, Customer)
+
+        def rows(conn, ids):
+            self._write(Customer, [
+                {'id': first + i, 'name': f'Customer {first + i}', 'email': f'customer{first + i}@example.com',
+                 'phone': f'555-{(first + i) % 10_000_000:07d}', 'address': f'{first + i} Main St',
+                 'password': self.password_hash, 'role': 'customer'}
+                for i in ids
+            ], conn, updated_at=utcnow())
+
+        self._batches('customers', count, rows)
+        return range(first, first + count)
+
+    def employees(self, count):
+        with self.engine.connect() as conn:
+            first = _next_id(conn, Employee)
+
+        def rows(conn, ids):
+            self._write(Employee, [
+                {'id': first + i, 'name': f'Mechanic {first + i}', 'email': f'mechanic{first + i}@example.com',
+                 'address': 'Shop', 'phone': f'555-{(first + i) % 10_000_000:07d}', 'password': self.password_hash,
+                 'salary': self.rng.randrange(45000, 95000, 500), 'role': 'mechanic'}
+                for i in ids
+            ], conn, updated_at=utcnow())
+
+        self._batches('employees', count, rows)
+        return range(first, first + count)
+
+    def cars(self, count, customer_ids):
+        if count and not customer_ids:
+            raise SeedError('Cars need customers; seed some or add --customers')
+        with self.engine.connect() as conn:
+            first = _next_id(conn, Car)
+        owners = array('q')
+        rng = self.rng
+
+        def rows(conn, ids):
+            chunk = []
+            for i in ids:
+                # Every customer gets a car before anyone gets a second
+                owner = customer_ids[i] if i < len(customer_ids) else rng.choice(customer_ids)
+                owners.append(owner)
+                make = rng.choice(list(MAKES))
+                chunk.append({'id': first + i, 'make': make, 'model': rng.choice(MAKES[make]),
+                              'color': rng.choice(COLORS), 'model_year': rng.randint(2005, 2025),
+                              'customer_id': owner})
+            self._write(Car, chunk, conn, updated_at=utcnow())
+
+        self._batches('cars', count, rows)
+        return range(first, first + count), owners
+
+    def tickets(self, count, car_ids, owners, employee_ids, prices):
+        if count and not (car_ids and employee_ids and prices):
+            raise SeedError('Tickets need cars, employees and service types')
+        service_type_ids = list(prices)
+        with self.engine.connect() as conn:
+            first = _next_id(conn, ServiceTicket)
+        rng = self.rng
+
+        def rows(conn, ids):
+            tickets, services, mechanics = [], [], []
+            for i in ids:
+                ticket_id = first + i
+                # Squaring skews visits towards a subset of cars, like repeat customers
+                index = int(len(car_ids) * rng.random() ** 2)
+                car_id = car_ids[index]
+                chosen = rng.sample(service_type_ids, min(rng.choices((1, 2, 3), weights=(5, 3, 2))[0], len(service_type_ids)))
+                tickets.append({'id': ticket_id, 'service_date': START_DATE + timedelta(days=rng.randrange(DAYS)),
+                                'customer_id': owners[index], 'car_id': car_id, 'VIN': vin(car_id),
+                                'car_issue': rng.choice(ISSUES), 'is_major_damage': rng.random() < 0.05,
+                                'total_price': round(sum(prices[i] for i in chosen), 2), 'service_count': len(chosen)})
+                for service_type_id in chosen:
+                    services.append({'service_ticket_id': ticket_id, 'service_type_id': service_type_id})
+                for employee_id in rng.sample(employee_ids, min(rng.choices((1, 2), weights=(4, 1))[0], len(employee_ids))):
+                    mechanics.append({'service_ticket_id': ticket_id, 'employee_id': employee_id})
+            self._write(ServiceTicket, tickets, conn, updated_at=utcnow())
+            self._write(ticket_service, services, conn)
+            self._write(mechanic_ticket, mechanics, conn)
+
+        self._batches('tickets', count, rows)
+
+    def run(self, customers=0, employees=0, cars=0, tickets=0, service_types=len(SERVICE_TYPES)):
+        prices = self.service_types(service_types)
+        customer_ids = self.customers(customers)
+        employee_ids = self.employees(employees)
+        if cars and not customer_ids:
+            with self.engine.connect() as conn:
+                customer_ids = list(conn.execute(select(Customer.id)).scalars())
+        car_ids, owners = self.cars(cars, customer_ids)
+        if tickets and not car_ids:
+            with self.engine.connect() as conn:
+                existing = conn.execute(select(Car.id, Car.customer_id)).all()
+            car_ids, owners = [c for c, _ in existing], [o for _, o in existing]
+        if tickets and not employee_ids:
+            with self.engine.connect() as conn:
+                employee_ids = list(conn.execute(select(Employee.id)).scalars())
+        self.tickets(tickets, car_ids, owners, list(employee_ids), prices)
+        return self.counts
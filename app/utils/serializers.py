@@ -0,0 +1,189 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from flask import request
+from marshmallow import fields
+from sqlalchemy import select, inspect
+from sqlalchemy.orm import load_only, lazyload, selectinload
+from app.models import db
+
+
+# ?fields= is client-controlled, so only this many narrowed serializers are kept per endpoint
+MAX_NARROWED = 32
+
+
+def _iso(value):
+    return None if value is None else value.isoformat()
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+# Marshmallow field types whose dump is a pure value conversion, mapped to that conversion
+_converters = {
+    fields.Date: _iso,
+    fields.DateTime: _iso,
+    fields.Float: _float,
+    fields.Integer: None,
+    fields.String: None,
+    fields.Boolean: None,
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def _converter(field):
+    for field_type, convert in _converters.items():
+        if type(field) is field_type:
+            return convert
+    raise TypeError(f'No fast conversion for {type(field).__name__}')
+
+
+class RowSerializer:
+    # Compiled once per schema: dumps Core rows exactly like schema.dump(many=True) dumps ORM objects,
+    # with each nested collection fetched by one IN query per page
+
+    def __init__(self, schema, model, only=None, keep=()):
+        self.schema = schema
+        self.model = model
+        self.field_names = [field.data_key or name for name, field in schema.dump_fields.items()]
+        self.columns = []
+        self._nested = None
+        self._nested_fields = []
+        self._narrowed = OrderedDict()
+        self._narrowed_lock = threading.Lock()
+        plain = []
+        converters = {}
+
+        for name, field in schema.dump_fields.items():
+            key = field.data_key or name
+            attribute = field.attribute or name
+            if only is not None and key not in only:
+                continue
+            if isinstance(field, fields.Nested):
+                self._nested_fields.append((key, attribute, field))
+                continue
+
+            convert = _converter(field)
+            self.columns.append(getattr(model, attribute))
+            index = len(self.columns) - 1
+            if convert:
+                converters[f'_c{index}'] = convert
+                plain.append(f'{key!r}: _c{index}(row[{index}])')
+            else:
+                plain.append(f'{key!r}: row[{index}]')
+
+        # Columns paging and nested loading rely on are selected even when they aren't returned
+        for column in (model.id, *keep):
+            if all(c.key != column.key for c in self.columns):
+                self.columns.append(column)
+        self._id_index = [c.key for c in self.columns].index('id')
+
+        source = f'def serialize(row):\n    return {{{", ".join(plain)}}}\n'
+        namespace = dict(converters)
+        exec(compile(source, f'<{model.__name__}RowSerializer>', 'exec'), namespace)
+        self._serialize = namespace['serialize']
+
+    @property
+    def nested(self):
+        # Nested schemas may be referenced by name, so they are resolved on first use rather than at import
+        if self._nested is None:
+            relationships = inspect(self.model).relationships
+            self._nested = [
+                (key, relationships[attribute], RowSerializer(field.schema, relationships[attribute].mapper.class_))
+                for key, attribute, field in self._nested_fields
+            ]
+        return self._nested
+
+    def narrow(self, only, keep=()):
+        if only is None and all(any(c.key == k.key for c in self.columns) for k in keep):
+            return self
+        key = (only, tuple(c.key for c in keep))
+        with self._narrowed_lock:
+            narrowed = self._narrowed.get(key)
+            if narrowed is not None:
+                self._narrowed.move_to_end(key)
+                return narrowed
+        narrowed = RowSerializer(self.schema, self.model, only, keep)
+        with self._narrowed_lock:
+            self._narrowed[key] = narrowed
+            while len(self._narrowed) > MAX_NARROWED:
+                self._narrowed.popitem(last=False)
+        return narrowed
+
+    def project(self, stmt):
+        return stmt.with_only_columns(*self.columns)
+
+    def select(self):
+        return select(*self.columns)
+
+    def _children(self, session, prop, child, parent_ids):
+        if prop.secondary is not None:
+            (_, link_col), = prop.synchronize_pairs
+            (child_col, child_link_col), = prop.secondary_synchronize_pairs
+            stmt = (select(link_col, *child.columns)
+                    .join_from(child.model, prop.secondary, child_col == child_link_col))
+        else:
+            (_, link_col), = prop.synchronize_pairs
+            stmt = select(link_col, *child.columns)
+
+        grouped = {parent_id: [] for parent_id in parent_ids}
+        for row in session.execute(stmt.where(link_col.in_(parent_ids))):
+            grouped[row[0]].append(child._serialize(row[1:]))
+        return grouped
+
+    def dump(self, rows, session=None):
+        serialize = self._serialize
+        results = [serialize(row) for row in rows]
+        if self._nested_fields and rows:
+            session = session or db.session
+            ids = [row[self._id_index] for row in rows]
+            for key, prop, child in self.nested:
+                grouped = self._children(session, prop, child, ids)
+                for result, parent_id in zip(results, ids):
+                    result[key] = grouped[parent_id]
+        return results
+
+
+def get_fields(field_names):
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    requested = frozenset(name.strip() for name in raw.split(',') if name.strip())
+    if not requested or not requested <= set(field_names):
+        raise FieldsError(f'fields must be a comma-separated list of: {", ".join(field_names)}')
+    return requested
+
+
+# One cache for every endpoint's schema, so it is sized for several of them
+@lru_cache(maxsize=MAX_NARROWED * 8)
+def _narrowed_schema(schema_type, only, many):
+    return schema_type(only=only, many=many)
+
+
+def narrow_schema(schema, only):
+    if only is None:
+        return schema
+    return _narrowed_schema(type(schema), frozenset(only), schema.many)
+
+
+def load_options(model, only):
+    # Only the requested columns are selected, and relationships nobody asked for are left unloaded
+    mapper = inspect(model)
+    columns = [getattr(model, name) for name in only if name in mapper.column_attrs]
+    options = [load_only(*(columns or [model.id]))]
+    for name, prop in mapper.relationships.items():
+        relationship = getattr(model, name)
+        options.append(selectinload(relationship) if name in only else lazyload(relationship))
+    return options
+
+
+def sparse_fields(model, schema, options=()):
+    # Loader options and schema for ?fields=, falling back to the endpoint's defaults without it
+    only = get_fields([field.data_key or name for name, field in schema.dump_fields.items()])
+    if only is None:
+        return list(options), schema
+    return load_options(model, only), narrow_schema(schema, only)
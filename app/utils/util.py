@@ -1,9 +1,13 @@
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta, timezone, date
 from jose import jwt
 import jose
 from functools import wraps
+from collections import OrderedDict
 from flask import request, jsonify
 import os
+import hashlib
+import threading
+import time
 
 SECRET_KEY = os.environ.get('SECRET_KEY') or "a super secret, secret key"
 
@@ -18,28 +22,80 @@ def encode_token(user_id, role):
     token = jwt.encode(payload, SECRET_KEY, algorithm='HS256')
     return token
     
+# Bounded LRU of decoded JWT payloads keyed by token digest. Entries expire at the
+# token's own exp, so a cached token is never accepted longer than jwt.decode would accept it.
+class TokenCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def set(self, token, data):
+        if self.maxsize <= 0 or 'exp' not in data:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (data, data['exp'])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(int(os.environ.get('JWT_CACHE_SIZE', 1024)))
+
+def get_bearer_token():
+    parts = request.headers.get('Authorization', '').split(" ")
+    if len(parts) == 2 and parts[0] == "Bearer" and parts[1]:
+        return parts[1]
+    return None
+
+def decode_token(token):
+    data = token_cache.get(token)
+    if data is None:
+        data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        token_cache.set(token, data)
+    return data
+
+def _authenticate():
+    token = get_bearer_token()
+    if not token:
+        return None, (jsonify({'message': 'Token is missing'}), 401)
+
+    try:
+        return decode_token(token), None
+    except jose.exceptions.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired!'}), 401)
+    except jose.exceptions.JWTError:
+        return None, (jsonify({'message': 'Invalid token!'}), 401)
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
+        data, error = _authenticate()
+        if error:
+            return error
         
-        if 'Authorization' in request.headers:
-            parts = request.headers['Authorization'].split(" ")
-            if len(parts) == 2 and parts[0] == "Bearer":
-                token = parts[1]
-            
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
-        
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            request.user_id = int(data['sub'])
-            request.user_role = data['role']
-            
-        except jose.exceptions.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jose.exceptions.JWTError:
-            return jsonify({'message': 'Invalid token!'}), 401
+        request.user_id = int(data['sub'])
+        request.user_role = data['role']
         
         return f(*args, **kwargs)
 
@@ -48,29 +104,40 @@ def token_required(f):
 def admin_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
+        data, error = _authenticate()
+        if error:
+            return error
         
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
-            
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
+        if data['role'] != 'mechanic':
+            return jsonify({'message': 'Unauthorized: Mechanic role required'}), 403
         
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            user_id = data['sub']
-            role = data['role']
-            
-            if role != 'mechanic':
-                return jsonify({'message': 'Unauthorized: Mechanic role required'}), 403
-            
-            request.employee_id = user_id
-            
-        except jose.exceptions.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired!'}), 401
-        except jose.exceptions.JWTError:
-            return jsonify({'message': 'Invalid token!'}), 401
+        request.employee_id = data['sub']
         
         return f(*args, **kwargs)
     
-    return decorated
\ No newline at end of file
+    return decorated
+
+def get_date_range(args):
+    try:
+        start = date.fromisoformat(args['from']) if args.get('from') else None
+        end = date.fromisoformat(args['to']) if args.get('to') else None
+    except ValueError:
+        raise ValueError('from and to must be dates in YYYY-MM-DD format')
+
+    if start and end and start > end:
+        raise ValueError('from must be on or before to')
+
+    return start, end
+
+
+def get_total_range(args):
+    try:
+        low = float(args['min_total']) if args.get('min_total') else None
+        high = float(args['max_total']) if args.get('max_total') else None
+    except ValueError:
+        raise ValueError('min_total and max_total must be numbers')
+
+    if low is not None and high is not None and low > high:
+        raise ValueError('min_total must be less than or equal to max_total')
+
+    return low, high
\ No newline at end of file
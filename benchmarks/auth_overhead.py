@@ -0,0 +1,56 @@
+"""Measure per-request overhead of token_required with and without the decoded-JWT cache.
+
+    python -m benchmarks.auth_overhead --requests 5000
+"""
+import argparse
+import time
+from flask import Flask
+from app.utils.util import encode_token, token_required, token_cache
+
+
+def build_app():
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    def ping():
+        return ''
+
+    @app.route('/protected')
+    @token_required
+    def protected():
+        return ''
+
+    return app
+
+
+def timed(client, path, headers, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    client = build_app().test_client()
+    headers = {'Authorization': f'Bearer {encode_token(1, "mechanic")}'}
+
+    baseline = timed(client, '/ping', {}, args.requests)
+
+    maxsize = token_cache.maxsize
+    token_cache.maxsize = 0
+    token_cache.clear()
+    uncached = timed(client, '/protected', headers, args.requests)
+    token_cache.maxsize = maxsize
+    cached = timed(client, '/protected', headers, args.requests)
+
+    print(f'unprotected route     {baseline:8.1f} us/request')
+    print(f'token_required, cold  {uncached:8.1f} us/request  (+{uncached - baseline:.1f} us auth)')
+    print(f'token_required, LRU   {cached:8.1f} us/request  (+{cached - baseline:.1f} us auth)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Synthetic Mechanic API dataset sized from a customer count: about 1.5 cars per customer,
+4 tickets per customer skewed towards repeat visitors, and one to three services and one
+or two mechanics per ticket. `flask seed` writes the same data at arbitrary sizes.
+
+    python -m benchmarks.data --uri sqlite:///bench.db --customers 2000
+"""
+import argparse
+import time
+from sqlalchemy import create_engine
+from werkzeug.security import generate_password_hash
+from app.models import Base
+from app.utils.seeding import Seeder, SERVICE_TYPES, EXTRA_SERVICE_TYPES
+
+PASSWORD = 'password'
+
+
+def generate(engine, customers, employees=None, seed=0, password_hash=None):
+    seeder = Seeder(engine, seed=seed,
+                    password_hash=password_hash or generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000'))
+    return seeder.run(customers=customers, employees=employees or max(customers // 100, 5),
+                      cars=customers * 3 // 2, tickets=customers * 4,
+                      service_types=len(SERVICE_TYPES) + len(EXTRA_SERVICE_TYPES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', required=True)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--employees', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    engine = create_engine(args.uri)
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    created = generate(engine, args.customers, args.employees, args.seed)
+    elapsed = time.perf_counter() - start
+    for table, count in created.items():
+        print(f'{table:<16} {count:>9}')
+    print(f'{sum(created.values())} rows in {elapsed:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
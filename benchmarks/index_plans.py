@@ -0,0 +1,124 @@
+"""Show query plans and timings for the common ticket/car lookups with and without
+the indexes declared in app/models.py.
+
+    python -m benchmarks.index_plans --tickets 200000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from sqlalchemy import create_engine, insert, select, text, func
+from app.models import (Base, Customer, Car, Employee, ServiceTicket, ServiceType,
+                        mechanic_ticket, ticket_service, create_missing_indexes)
+
+
+def seed(engine, tickets, rng):
+    customers = max(tickets // 10, 1)
+    cars = customers * 2
+    start = date(2024, 1, 1)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Customer), [
+            {'name': f'Customer {i}', 'email': f'c{i}@example.com', 'phone': '555-0100',
+             'address': f'{i} Main St', 'password': 'x', 'role': 'customer'}
+            for i in range(customers)
+        ])
+        conn.execute(insert(Car), [
+            {'make': rng.choice(['Toyota', 'Honda', 'Ford', 'Nissan']), 'model': f'Model {i % 50}',
+             'color': 'Gray', 'model_year': 2000 + i % 25, 'customer_id': i // 2 + 1}
+            for i in range(cars)
+        ])
+        conn.execute(insert(Employee), [
+            {'name': f'Mechanic {i}', 'email': f'm{i}@example.com', 'address': 'Shop', 'phone': '555-0101',
+             'password': 'x', 'salary': 60000, 'role': 'mechanic'}
+            for i in range(20)
+        ])
+        conn.execute(insert(ServiceType), [
+            {'name': f'Service {i}', 'price': 20 + i * 5} for i in range(10)
+        ])
+        conn.execute(insert(ServiceTicket), [
+            {'service_date': start + timedelta(days=i % 365), 'customer_id': (car - 1) // 2 + 1, 'car_id': car,
+             'VIN': f'VIN{car:010d}', 'car_issue': 'Noise', 'is_major_damage': False}
+            for i, car in enumerate(rng.randint(1, cars) for _ in range(tickets))
+        ])
+        conn.execute(insert(mechanic_ticket), [
+            {'employee_id': rng.randint(1, 20), 'service_ticket_id': i} for i in range(1, tickets + 1)
+        ])
+        conn.execute(insert(ticket_service), [
+            {'service_ticket_id': i, 'service_type_id': rng.randint(1, 10)} for i in range(1, tickets + 1)
+        ])
+    return cars
+
+
+def lookups(cars):
+    car_id = cars // 2
+    return {
+        'tickets for car': select(ServiceTicket.id).where(ServiceTicket.car_id == car_id),
+        'tickets for VIN': select(ServiceTicket.id).where(ServiceTicket.VIN == f'VIN{car_id:010d}'),
+        'tickets for customer': select(ServiceTicket.id).where(ServiceTicket.customer_id == car_id // 2),
+        'tickets in date range': select(ServiceTicket.id).where(
+            ServiceTicket.service_date.between(date(2024, 3, 1), date(2024, 3, 7))),
+        'cars for customer': select(Car.id).where(Car.customer_id == car_id // 2),
+        # The prefix range the search route builds for make=toy&model_year=2010
+        'cars by make and year': select(Car.id).where(func.lower(Car.make) >= 'toy', func.lower(Car.make) < 'toz',
+                                                      Car.model_year == 2010),
+        'cars by year': select(Car.id).where(Car.model_year == 2010),
+        # max(updated_at) halves of the conditional-GET validators in app/utils/caching.py
+        'tickets last modified': select(func.max(ServiceTicket.updated_at)),
+        'customer cars last modified': select(func.max(Car.updated_at)).where(Car.customer_id == car_id // 2),
+        'mechanics on ticket': select(mechanic_ticket.c.employee_id).where(mechanic_ticket.c.service_ticket_id == 42),
+        'tickets for service type': select(ticket_service.c.service_ticket_id).where(ticket_service.c.service_type_id == 3),
+    }
+
+
+def run(engine, queries, repeat):
+    results = {}
+    with engine.connect() as conn:
+        for name, stmt in queries.items():
+            sql = str(stmt.compile(engine, compile_kwargs={'literal_binds': True}))
+            plan = ' | '.join(row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+            started = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(stmt).all()
+            results[name] = (plan, (time.perf_counter() - started) / repeat * 1000)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        Base.metadata.create_all(engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(engine)
+
+        cars = seed(engine, args.tickets, random.Random(args.seed))
+        queries = lookups(cars)
+
+        before = run(engine, queries, args.repeat)
+        create_missing_indexes(engine)
+        with engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+        after = run(engine, queries, args.repeat)
+
+        for name in queries:
+            print(name)
+            print(f'  before {before[name][1]:8.3f} ms  {before[name][0]}')
+            print(f'  after  {after[name][1]:8.3f} ms  {after[name][0]}')
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Latency of a non-auth endpoint while a burst of logins is hashing passwords,
+with hashing inline versus on the bounded process pool.
+
+    python -m benchmarks.login_storm --logins 40 --concurrency 8
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from urllib import request as urlrequest
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import make_server
+
+
+def post_json(url, payload):
+    req = urlrequest.Request(url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'})
+    with urlrequest.urlopen(req) as response:
+        return response.read()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(workers, args):
+    from app import create_app
+    from app.models import db, Customer
+    from app.utils.passwords import hash_password
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app('TestingConfig', SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}',
+                     PASSWORD_HASH_METHOD=args.method, PASSWORD_HASH_WORKERS=workers)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Customer(name='Storm', email='storm@example.com', phone='1', address='1',
+                                password=hash_password('secret'), role='customer'))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    credentials = {'email': 'storm@example.com', 'password': 'secret', 'role': 'customer'}
+
+    latencies = []
+    storming = threading.Event()
+    storming.set()
+
+    def probe():
+        while storming.is_set():
+            started = time.perf_counter()
+            urlrequest.urlopen(f'{base}/service_types/').read()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        list(executor.map(lambda _: post_json(f'{base}/customers/login', credentials),
+                          range(args.logins)))
+    storming.clear()
+    prober.join()
+    server.shutdown()
+    os.remove(path)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--method', default='scrypt:32768:8:1')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    for label, workers in (('inline', 0), (f'pool({args.workers})', args.workers)):
+        latencies = run(workers, args)
+        print(f'{label:10} GET /service_types/ during storm: n={len(latencies)} '
+              f'p50={statistics.median(latencies):.1f}ms p99={percentile(latencies, 99):.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
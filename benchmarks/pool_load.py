@@ -0,0 +1,142 @@
+"""Throughput of GET /cars/ from several worker processes against a database that
+refuses connections past a limit, like MySQL's max_connections.
+
+Compares an unconstrained baseline, pools whose workers x (pool_size + max_overflow)
+exceeds the limit, and pools sized to fit under it.
+
+    python -m benchmarks.pool_load --workers 4 --threads 8 --limit 12
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+class LimitedConnection(sqlite3.Connection):
+    slots = None
+
+    def close(self):
+        if not getattr(self, '_released', False):
+            self._released = True
+            self.slots.release()
+        super().close()
+
+
+def make_creator(path, slots):
+    LimitedConnection.slots = slots
+
+    def connect():
+        # A full server rejects the connection outright instead of queueing it
+        if not slots.acquire(block=False):
+            raise sqlite3.OperationalError('Too many connections')
+        return sqlite3.connect(path, check_same_thread=False, factory=LimitedConnection)
+
+    return connect
+
+
+def worker(path, slots, options, threads, duration, results):
+    from app import create_app
+    from app.models import db
+    from app.utils.db_pool import pool_stats
+
+    app = create_app('TestingConfig', SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}',
+                     SQLALCHEMY_ENGINE_OPTIONS={**options, 'creator': make_creator(path, slots)})
+    client = app.test_client()
+    deadline = time.perf_counter() + duration
+    latencies, errors = [], []
+
+    def hammer():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = client.get('/cars/?per_page=20').status_code
+            except Exception as e:
+                # DEBUG propagates errors raised outside the view's own try/except
+                status = type(e).__name__
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+
+    pool = [threading.Thread(target=hammer) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    with app.app_context():
+        results.put((latencies, len(errors), pool_stats(db.engine)))
+
+
+def run(name, path, limit, options, args):
+    ctx = multiprocessing.get_context('fork')
+    slots = ctx.BoundedSemaphore(limit)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(path, slots, options, args.threads, args.duration, results))
+             for _ in range(args.workers)]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    latencies = [l for worker_latencies, _, _ in collected for l in worker_latencies]
+    errors = sum(e for _, e, _ in collected)
+    stats = [s for _, _, s in collected]
+    per_worker = options['pool_size'] + options['max_overflow']
+    print(f'{name:<10} limit={limit:<5} pools={args.workers}x{per_worker:<3} '
+          f'ok/s={len(latencies) / args.duration:7.1f} errors={errors:<6} '
+          f'p50={statistics.median(latencies) * 1000 if latencies else 0:6.1f}ms '
+          f'p99={percentile(latencies, 99) * 1000:7.1f}ms '
+          f'peak_checked_out={max(s["peak_checked_out"] for s in stats):<3} '
+          f'max_wait={max(s["wait_seconds_max"] for s in stats) * 1000:7.1f}ms '
+          f'timeouts={sum(s["timeouts"] for s in stats)}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--limit', type=int, default=12, help='simulated max_connections')
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--cars', type=int, default=500)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine, insert
+    from app.models import Base, Customer, Car
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = create_engine(f'sqlite:///{path}')
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(Customer), [{'name': 'Load', 'email': 'load@example.com', 'phone': '555',
+                                             'address': 'Shop', 'password': 'x', 'role': 'customer'}])
+            conn.execute(insert(Car), [{'make': 'Toyota', 'model': f'Model {i}', 'color': 'Gray',
+                                        'model_year': 2020, 'customer_id': 1} for i in range(args.cars)])
+        engine.dispose()
+
+        oversized = {'pool_size': args.threads, 'max_overflow': args.threads, 'pool_timeout': 10}
+        # Every worker's pool fits under the limit, so excess requests wait for a pooled connection
+        fitted = {'pool_size': max(args.limit // args.workers, 1), 'max_overflow': 0, 'pool_timeout': 10,
+                  'pool_pre_ping': True}
+
+        run('baseline', path, 10_000, oversized, args)
+        run('oversized', path, args.limit, oversized, args)
+        run('fitted', path, args.limit, fitted, args)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
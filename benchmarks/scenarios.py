@@ -0,0 +1,277 @@
+"""Scripted request scenarios against a synthetic dataset, through the Flask test client
+or a local gunicorn, reporting throughput and p50/p95/p99 and comparing them with a saved
+baseline so regressions show up.
+
+    python -m benchmarks.scenarios --target client --customers 2000 --save benchmarks/baseline.json
+    python -m benchmarks.scenarios --target gunicorn --workers 2 --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from datetime import date, timedelta
+from sqlalchemy import create_engine, func, select
+from werkzeug.security import generate_password_hash
+from app.models import Base, Car, Customer, ServiceTicket, ServiceType
+from app.utils.util import encode_token
+from app.utils.seeding import MAKES, START_DATE, DAYS, vin
+from benchmarks.data import PASSWORD, generate
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def wsgi_app():
+    # gunicorn 'benchmarks.scenarios:wsgi_app()'; the runner passes the database through the environment
+    from app import create_app
+    return create_app('TestingConfig', SQLALCHEMY_DATABASE_URI=os.environ['BENCH_DATABASE_URI'],
+                      RATELIMIT_ENABLED=False, DEBUG=False)
+
+
+class ClientTarget:
+    def __init__(self, uri):
+        os.environ['BENCH_DATABASE_URI'] = uri
+        self.client = wsgi_app().test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        return self.client.open(path, method=method, json=body, headers=headers).status_code
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    def __init__(self, uri, workers, threads):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+             '--bind', f'127.0.0.1:{self.port}', '--log-level', 'warning', 'benchmarks.scenarios:wsgi_app()'],
+            env=dict(os.environ, BENCH_DATABASE_URI=uri))
+        self.local = threading.local()
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or self.proc.poll() is not None:
+                    self.close()
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.1)
+
+    def request(self, method, path, body=None, headers=None):
+        # One keep-alive connection per client thread
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = HTTPConnection('127.0.0.1', self.port, timeout=30)
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, ValueError):
+            conn.close()
+            self.local.conn = None
+            return 'error'
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+@scenario('list_paging')
+def list_paging(ctx, rng):
+    resource, total = rng.choice([('cars', ctx['cars']), ('customers', ctx['customers']), ('tickets', ctx['tickets'])])
+    page = rng.randint(1, max(total // 20, 1))
+    return 'GET', f'/{resource}/?page={page}&per_page=20', None, None
+
+
+@scenario('search')
+def search(ctx, rng):
+    make = rng.choice(list(MAKES))
+    query = rng.choice([f'make={make[:3].lower()}', f'model={rng.choice(MAKES[make])[:2].lower()}',
+                        f'make={make.lower()}&model_year={rng.randint(2005, 2025)}'])
+    return 'GET', f'/cars/search?{query}&per_page=20', None, None
+
+
+@scenario('login_storm')
+def login_storm(ctx, rng):
+    email = f'customer{rng.randint(1, ctx["customers"])}@example.com'
+    return 'POST', '/customers/login', {'email': email, 'password': PASSWORD, 'role': 'customer'}, None
+
+
+@scenario('ticket_creation')
+def ticket_creation(ctx, rng):
+    car_id = rng.randint(1, ctx['cars'])
+    body = {'service_date': (START_DATE + timedelta(days=rng.randrange(DAYS))).isoformat(),
+            'customer_id': ctx['car_owners'][car_id - 1], 'car_id': car_id, 'VIN': vin(car_id),
+            'car_issue': 'Benchmark', 'is_major_damage': False,
+            'service_type_ids': rng.sample(range(1, ctx['service_types'] + 1), 2)}
+    return 'POST', '/tickets/', body, ctx['mechanic_auth']
+
+
+@scenario('working_tickets')
+def working_tickets(ctx, rng):
+    start = START_DATE + timedelta(days=rng.randrange(DAYS - 90))
+    return 'GET', f'/employees/working_tickets?limit=10&from={start}&to={start + timedelta(days=90)}', None, None
+
+
+def run_scenario(target, fn, ctx, requests, concurrency, seed, warmup):
+    rng = random.Random(seed)
+    # Warm-up requests fill caches and pools without being counted
+    for _ in range(warmup):
+        target.request(*fn(ctx, rng))
+    calls = [fn(ctx, rng) for _ in range(requests)]
+    latencies, errors = [], []
+
+    def call(args):
+        start = time.perf_counter()
+        status = target.request(*args)
+        elapsed = time.perf_counter() - start
+        if isinstance(status, int) and status < 400:
+            latencies.append(elapsed)
+        else:
+            errors.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(call, calls))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': requests,
+        'errors': len(errors),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else 0.0,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        throughput = (result['throughput'] - base['throughput']) / base['throughput'] * 100 if base['throughput'] else 0
+        p95 = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0
+        flag = ''
+        if throughput < -tolerance or p95 > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'  {name:<16} throughput {throughput:+6.1f}%  p95 {p95:+6.1f}%{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--uri', help='database to benchmark; a temporary SQLite file is seeded when omitted')
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='uncounted requests before each scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                        help='password hash for seeded users, e.g. scrypt:32768:8:1 for production-cost logins')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--tolerance', type=float, default=20, help='percent change reported as a regression')
+    parser.add_argument('--save', help='write results to this file')
+    args = parser.parse_args()
+
+    path = None
+    uri = args.uri
+    if uri is None:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        uri = f'sqlite:///{path}'
+        engine = create_engine(uri)
+        Base.metadata.create_all(engine)
+        generate(engine, args.customers, seed=args.seed,
+                 password_hash=generate_password_hash(PASSWORD, args.hash_method))
+    else:
+        engine = create_engine(uri)
+
+    try:
+        with engine.connect() as conn:
+            car_owners = list(conn.execute(select(Car.customer_id).order_by(Car.id)).scalars())
+            ctx = {
+                'customers': conn.execute(select(func.count()).select_from(Customer)).scalar(),
+                'cars': len(car_owners),
+                'car_owners': car_owners,
+                'tickets': conn.execute(select(func.count()).select_from(ServiceTicket)).scalar(),
+                'service_types': conn.execute(select(func.count()).select_from(ServiceType)).scalar(),
+                'mechanic_auth': {'Authorization': f'Bearer {encode_token(1, "mechanic")}'},
+            }
+        engine.dispose()
+
+        target = ClientTarget(uri) if args.target == 'client' else GunicornTarget(uri, args.workers, args.threads)
+        results = {}
+        try:
+            for name in args.scenarios:
+                results[name] = run_scenario(target, SCENARIOS[name], ctx, args.requests, args.concurrency,
+                                             args.seed, args.warmup)
+                r = results[name]
+                print(f'{name:<16} n={r["requests"]:<6} errors={r["errors"]:<4} {r["throughput"]:8.1f} req/s  '
+                      f'p50={r["p50_ms"]:7.2f}ms p95={r["p95_ms"]:7.2f}ms p99={r["p99_ms"]:7.2f}ms')
+        finally:
+            target.close()
+    finally:
+        if path:
+            os.remove(path)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        print(f'vs {args.baseline} ({saved["meta"]["target"]}, {saved["meta"]["date"]}):')
+        if saved['meta']['target'] != args.target:
+            print('  warning: baseline was recorded against a different target')
+        regressions = compare(results, saved['results'], args.tolerance)
+
+    if args.save:
+        meta = {'target': args.target, 'date': date.today().isoformat(), 'python': platform.python_version(),
+                'customers': ctx['customers'], 'requests': args.requests, 'concurrency': args.concurrency,
+                'seed': args.seed, 'hash_method': args.hash_method}
+        if args.target == 'gunicorn':
+            meta.update(workers=args.workers, threads=args.threads)
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+            f.write('\n')
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compare marshmallow schema.dump(many=True) against the compiled row serializers
+used by the list endpoints.
+
+    python -m benchmarks.serializers --rows 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from app import create_app
+from app.models import db, Car, Customer, ServiceTicket
+from benchmarks.index_plans import seed
+
+
+def best_of(repeat, fn, fresh=False):
+    timings = []
+    for _ in range(repeat):
+        if fresh:
+            db.session.expunge_all()
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def compare(name, model, schema, rows_serializer, limit, repeat):
+    stmt = select(model).order_by(model.id).limit(limit)
+    # The ORM side gets the same one-query-per-relationship loading the row serializer does
+    orm_stmt = stmt.options(*[selectinload(prop) for _, prop, _ in rows_serializer.nested])
+    objects = db.session.execute(orm_stmt).scalars().all()
+    rows = db.session.execute(rows_serializer.project(stmt)).all()
+
+    dump_only, expected = best_of(repeat, lambda: schema.dump(objects))
+    rows_only, actual = best_of(repeat, lambda: rows_serializer.dump(rows))
+    dump_total, _ = best_of(repeat, lambda: schema.dump(db.session.execute(orm_stmt).scalars().all()), fresh=True)
+    rows_total, _ = best_of(repeat, lambda: rows_serializer.dump(db.session.execute(rows_serializer.project(stmt)).all()), fresh=True)
+
+    identical = current_app.json.dumps(expected) == current_app.json.dumps(actual)
+    print(f'{name:<10} {len(objects):>6} rows  '
+          f'dump {dump_only * 1000:8.1f} ms -> {rows_only * 1000:7.1f} ms ({dump_only / rows_only:4.1f}x)  '
+          f'query+dump {dump_total * 1000:8.1f} ms -> {rows_total * 1000:7.1f} ms ({dump_total / rows_total:4.1f}x)  '
+          f'identical={identical}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app.blueprints.cars.schemas import cars_schema, car_rows
+    from app.blueprints.customers.schemas import customers_schema, customer_rows
+    from app.blueprints.Service_Ticket.schemas import service_tickets_schema, service_ticket_rows
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = create_app('TestingConfig', SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+        with app.app_context():
+            db.create_all()
+            # seed() makes tickets/10 customers with two cars each
+            seed(db.engine, args.rows * 10, random.Random(0))
+            compare('cars', Car, cars_schema, car_rows, args.rows, args.repeat)
+            compare('customers', Customer, customers_schema, customer_rows, args.rows, args.repeat)
+            compare('tickets', ServiceTicket, service_tickets_schema, service_ticket_rows, args.rows, args.repeat)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
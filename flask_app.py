@@ -1,5 +1,5 @@
 from app import create_app
-from app.models import db
+from app.models import db, create_missing_columns, create_missing_indexes, repair_ticket_totals
 
 
 app = create_app('ProductionConfig')
@@ -11,4 +11,8 @@ def home():
 with app.app_context():
     # db.drop_all()
     db.create_all() 
+    if 'service_ticket.total_price' in create_missing_columns():
+        # Tickets written before the column existed start out NULL
+        repair_ticket_totals()
+    create_missing_indexes()
     
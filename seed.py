@@ -1,20 +1,18 @@
 from app import create_app
 from app.models import db, ServiceType
+from app.utils.seeding import SERVICE_TYPES
 from sqlalchemy import select
 
-app = create_app('DevelopmentConfig')
+# Idempotent catalogue only; `flask seed` generates bulk synthetic data
 
-with app.app_context():
-    service_types = [
-        {"name": "Oil Change", "price": 29.99},
-        {"name": "Tire Rotation", "price": 49.99},
-        {"name": "Brake Inspection", "price": 39.99}
-    ]
-    
-    for st in service_types:
-        exists = db.session.execute(select(ServiceType).where(ServiceType.name == st["name"])).scalar_one_or_none()
-        if not exists:
-            db.session.add(ServiceType(name=st["name"], price=st["price"]))
-            
-    db.session.commit()
-    print("Service types seeded")
\ No newline at end of file
+if __name__ == '__main__':
+    app = create_app('DevelopmentConfig')
+
+    with app.app_context():
+        for st in SERVICE_TYPES:
+            exists = db.session.execute(select(ServiceType).where(ServiceType.name == st["name"])).scalar_one_or_none()
+            if not exists:
+                db.session.add(ServiceType(name=st["name"], price=st["price"]))
+
+        db.session.commit()
+        print("Service types seeded")
@@ -0,0 +1,105 @@
+import sqlite3
+import unittest
+from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from werkzeug.security import generate_password_hash
+from app import create_app
+from app.extensions import cache, limiter
+from app.models import db
+from app.utils.util import encode_token
+from config import TestingConfig
+
+
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+class SavepointConnection(sqlite3.Connection):
+    # While a test runs, commit() and rollback() from any engine only move the test's savepoint,
+    # so everything it wrote disappears with the outer transaction in tearDown
+
+    in_test = False
+
+    def begin_test(self):
+        self.execute('BEGIN')
+        self.execute('SAVEPOINT test')
+        self.in_test = True
+
+    def end_test(self):
+        self.in_test = False
+        self.execute('ROLLBACK')
+
+    def commit(self):
+        if self.in_test:
+            self.execute('RELEASE SAVEPOINT test')
+            self.execute('SAVEPOINT test')
+        else:
+            super().commit()
+
+    def rollback(self):
+        if self.in_test:
+            self.execute('ROLLBACK TO SAVEPOINT test')
+        else:
+            super().rollback()
+
+    def close(self):
+        # Every engine in the process shares it, so a pool closing "its" connection must not drop the database
+        pass
+
+
+# One in-memory database per process: parallel test processes never touch the same file.
+# isolation_level=None stops sqlite3 from issuing its own BEGIN/COMMIT around ours.
+connection = sqlite3.connect(':memory:', factory=SavepointConnection, check_same_thread=False, isolation_level=None)
+ENGINE_OPTIONS = {'creator': lambda: connection, 'poolclass': StaticPool}
+
+
+def create_test_app(**overrides):
+    return create_app('TestingConfig', **{'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SQLALCHEMY_ENGINE_OPTIONS': ENGINE_OPTIONS,
+                                          **overrides})
+
+
+@lru_cache(maxsize=None)
+def shared_app():
+    app = create_test_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@lru_cache(maxsize=None)
+def password_hash(password, method=TestingConfig.PASSWORD_HASH_METHOD):
+    return generate_password_hash(password, method)
+
+
+@lru_cache(maxsize=None)
+def make_token(user_id, role):
+    return encode_token(user_id, role)
+
+
+class AppTestCase(unittest.TestCase):
+    # The app and schema are built once per process; each test runs inside a transaction that is rolled back
+
+    def setUp(self):
+        self.app = shared_app()
+        self.client = self.app.test_client()
+        connection.begin_test()
+        self.addCleanup(connection.end_test)
+        with self.app.app_context():
+            cache.clear()
+        limiter.reset()
+
+    def create_app(self, **overrides):
+        # Another app, e.g. a second worker or a different config, reading the same rows as self.app
+        return create_test_app(**overrides)
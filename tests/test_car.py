@@ -1,22 +1,21 @@
-import unittest
-from app import create_app
-from app.models import db, Customer, Car
-from werkzeug.security import generate_password_hash
-from app.utils.util import encode_token
+import shutil
+import tempfile
+from sqlalchemy import event
+from app.extensions import cache
+from app.models import db, Base, Customer, Car
+from app.utils.db_pool import pool_stats
+from app.utils.instrumentation import TimedJSONProvider
+from helpers import AppTestCase, password_hash, make_token
 
-class TestCar(unittest.TestCase):
+class TestCar(AppTestCase):
     def setUp(self):
-        self.app = create_app("TestingConfig")
-        self.client = self.app.test_client()
+        super().setUp()
         
         with self.app.app_context():
-            db.drop_all()
-            db.create_all()
-            
             self.customer = Customer(
                 name = "Test User",
                 email = "testuser@email.com",
-                password = generate_password_hash("password"),
+                password = password_hash("password"),
                 address = "123 Main St",
                 phone = "222-333-4444",
                 role = "customer"
@@ -26,7 +25,7 @@ class TestCar(unittest.TestCase):
             db.session.commit()
             
             self.customer_id = self.customer.id
-            self.token = encode_token(user_id = self.customer_id, role = "customer")
+            self.token = make_token(user_id = self.customer_id, role = "customer")
             self.auth_header = {
                 "Authorization": f"Bearer {self.token}"
             }
@@ -151,7 +150,7 @@ class TestCar(unittest.TestCase):
             other_customer = Customer(
                 name="Other User",
                 email="otheruser@email.com",
-                password=generate_password_hash("otherpass"),
+                password=password_hash("otherpass"),
                 address="456 Side St",
                 phone="999-888-7777",
                 role="customer"
@@ -225,7 +224,284 @@ class TestCar(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
 
         data = response.get_json()
-        self.assertIsInstance(data, list)
-        self.assertEqual(len(data), 2)
-        for car in data:
+        self.assertIsInstance(data["cars"], list)
+        self.assertEqual(len(data["cars"]), 2)
+        for car in data["cars"]:
             self.assertIn("Nissan", car["make"])
+
+    def test_get_cars_paginated_total(self):
+        with self.app.app_context():
+            for i in range(3):
+                db.session.add(Car(make=f"Make{i}", model=f"Model{i}", model_year=2020, color="Red", customer_id=self.customer_id))
+            db.session.commit()
+
+        response = self.client.get("/cars/?page=2&per_page=2")
+        self.assertEqual(response.status_code, 200)
+
+        data = response.get_json()
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(data["total_count"], 3)
+        self.assertEqual(data["pages"], 2)
+        self.assertEqual(len(data["cars"]), 1)
+        self.assertEqual(data["cars"][0]["make"], "Make2")
+
+    def test_get_cars_invalid_page_args(self):
+        for query in ["page=0", "per_page=0", "per_page=1000", "page=abc"]:
+            response = self.client.get(f"/cars/?{query}")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("message", response.get_json())
+
+    def test_get_cars_after_id(self):
+        with self.app.app_context():
+            for i in range(3):
+                db.session.add(Car(make=f"Make{i}", model=f"Model{i}", model_year=2020, color="Red", customer_id=self.customer_id))
+            db.session.commit()
+
+        response = self.client.get("/cars/?after_id=1&per_page=1")
+        self.assertEqual(response.status_code, 200)
+
+        data = response.get_json()
+        self.assertEqual([c["id"] for c in data["cars"]], [2])
+        self.assertIsNotNone(data["next_cursor"])
+
+        response = self.client.get(f"/cars/?per_page=5&cursor={data['next_cursor']}")
+        data = response.get_json()
+        self.assertEqual([c["id"] for c in data["cars"]], [3])
+        self.assertIsNone(data["next_cursor"])
+
+
+    def test_search_car_multi_field_prefix(self):
+        with self.app.app_context():
+            db.session.add_all([
+                Car(make="Nissan", model="Altima", model_year=2021, color="Gray", customer_id=self.customer_id),
+                Car(make="Nissan", model="Sentra", model_year=2022, color="Black", customer_id=self.customer_id),
+                Car(make="Honda", model="Pilot", model_year=2021, color="gray", customer_id=self.customer_id)
+            ])
+            db.session.commit()
+
+        data = self.client.get("/cars/search?make=nis&model=sen").get_json()
+        self.assertEqual([c["model"] for c in data["cars"]], ["Sentra"])
+
+        data = self.client.get("/cars/search?color=GRAY&model_year=2021").get_json()
+        self.assertEqual(data["total"], 2)
+
+        data = self.client.get("/cars/search?make=san").get_json()
+        self.assertEqual(data["total"], 0)
+
+        data = self.client.get("/cars/search?make=san&match=contains").get_json()
+        self.assertEqual(data["total"], 2)
+
+        data = self.client.get("/cars/search?make=nissan&per_page=1").get_json()
+        self.assertEqual(len(data["cars"]), 1)
+        self.assertEqual(data["pages"], 2)
+
+    def test_search_car_without_filters(self):
+        response = self.client.get("/cars/search")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("message", response.get_json())
+
+    def test_get_car_cache_evicted_on_update(self):
+        with self.app.app_context():
+            car = Car(make="Honda", model="Civic", model_year=2021, color="Blue", customer_id=self.customer_id)
+            db.session.add(car)
+            db.session.commit()
+            car_id = car.id
+
+        self.assertEqual(self.client.get(f"/cars/{car_id}").get_json()["color"], "Blue")
+        self.assertEqual(self.client.get(f"/customers/{self.customer_id}/cars").get_json()[0]["color"], "Blue")
+
+        response = self.client.put(f"/cars/{car_id}", json={"color": "Red"}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get(f"/cars/{car_id}").get_json()["color"], "Red")
+        self.assertEqual(self.client.get(f"/customers/{self.customer_id}/cars").get_json()[0]["color"], "Red")
+
+        self.client.delete(f"/cars/{car_id}", headers=self.auth_header)
+        self.assertEqual(self.client.get(f"/cars/{car_id}").status_code, 404)
+
+
+    def test_shared_cache_invalidation_across_workers(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        shared = {"CACHE_TYPE": "FileSystemCache", "CACHE_DIR": cache_dir, "CACHE_SERIALIZER": "json", "CACHE_KEY_PREFIX": "test:"}
+        worker_a = self.create_app(**shared).test_client()
+        worker_b = self.create_app(**shared).test_client()
+
+        with self.app.app_context():
+            car = Car(make="Kia", model="Soul", model_year=2020, color="White", customer_id=self.customer_id)
+            db.session.add(car)
+            db.session.commit()
+            car_id = car.id
+
+        self.assertEqual(worker_a.get(f"/cars/{car_id}").get_json()["color"], "White")
+        self.assertEqual(worker_b.get(f"/cars/{car_id}").get_json()["color"], "White")
+
+        worker_b.put(f"/cars/{car_id}", json={"color": "Green"}, headers=self.auth_header)
+        self.assertEqual(worker_a.get(f"/cars/{car_id}").get_json()["color"], "Green")
+
+    def test_cache_entry_limit_counts_bytes(self):
+        app = self.create_app()
+        app.json.ensure_ascii = False
+        client = app.test_client()
+        with app.app_context():
+            car = Car(make="Škoda", model="Octavia", model_year=2019, color="Šedá", customer_id=self.customer_id)
+            db.session.add(car)
+            db.session.commit()
+            car_id = car.id
+
+        body = client.get(f"/cars/{car_id}").get_data(as_text=True)
+        app.config["CACHE_MAX_ENTRY_BYTES"] = len(body)
+        with app.app_context():
+            cache.clear()
+            client.get(f"/cars/{car_id}")
+            self.assertFalse([key for key in cache.cache._cache if key.startswith("entity:")])
+
+    def test_process_local_cache_warns_outside_debug(self):
+        with self.assertLogs("app.utils.caching", level="WARNING") as logs:
+            self.create_app(DEBUG=False, ENTITY_CACHE_TIMEOUT=30)
+        self.assertIn("each worker caches separately", logs.output[0])
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with self.assertNoLogs("app.utils.caching", level="WARNING"):
+            self.create_app(DEBUG=False, CACHE_TYPE="FileSystemCache", CACHE_DIR=cache_dir)
+
+    def test_sparse_fieldsets(self):
+        with self.app.app_context():
+            car = Car(make="Honda", model="Civic", model_year=2021, color="Blue", customer_id=self.customer_id)
+            db.session.add(car)
+            db.session.commit()
+            car_id = car.id
+
+        response = self.client.get(f"/cars/{car_id}?fields=make,model_year")
+        self.assertEqual(response.get_json(), {"make": "Honda", "model_year": 2021})
+
+        response = self.client.get(f"/cars/{car_id}")
+        self.assertEqual(response.get_json()["color"], "Blue")
+
+        response = self.client.get("/cars/search?make=hon&fields=model&sort=make")
+        self.assertEqual(response.get_json()["cars"], [{"model": "Civic"}])
+
+        response = self.client.get("/cars/?fields=vin")
+        self.assertEqual(response.status_code, 400)
+
+    def test_pre_ping_replaces_dropped_connections(self):
+        # Needs a real pool of its own rather than the suite's shared in-memory connection
+        db_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, db_dir)
+        app = self.create_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{db_dir}/pool.db",
+                              SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 1, "max_overflow": 0, "pool_pre_ping": True})
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            engine = db.engine
+        checkouts = pool_stats(engine)["checkouts"]
+
+        # Simulate the server closing the connection while it sits idle in the pool
+        event.listen(engine, "checkin", lambda dbapi_connection, record: dbapi_connection.close(), once=True)
+        self.assertEqual(client.get("/cars/").status_code, 200)
+        self.assertEqual(client.get("/cars/").status_code, 200)
+
+        stats = pool_stats(engine)
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["checkouts"], checkouts + 2)
+        self.assertEqual(stats["timeouts"], 0)
+        engine.dispose()
+
+    def replica_app(self, **overrides):
+        replica_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, replica_dir)
+        app = self.create_app(SQLALCHEMY_REPLICA_URI=f"sqlite:///{replica_dir}/replica.db",
+                         REPLICA_LAG_CHECK_SECONDS=0, **overrides)
+        replica = app.extensions["replica_engine"]
+        Base.metadata.create_all(replica)
+        with replica.begin() as conn:
+            conn.execute(Customer.__table__.insert(), [{"id": 1, "name": "Replica", "email": "r@email.com", "phone": "1",
+                                                        "address": "Replica St", "password": "x", "role": "customer"}])
+            conn.execute(Car.__table__.insert(), [{"make": "Replica", "model": "Lagging", "model_year": 2020,
+                                                   "color": "Gray", "customer_id": 1}])
+        self.addCleanup(replica.dispose)
+        return app
+
+    def test_reads_route_to_replica_and_writes_to_primary(self):
+        app = self.replica_app()
+        client = app.test_client()
+
+        response = client.get("/cars/")
+        self.assertEqual([car["make"] for car in response.get_json()["cars"]], ["Replica"])
+
+        token = make_token(self.customer_id, "customer")
+        response = client.post(f"/customers/{self.customer_id}/cars", headers={"Authorization": f"Bearer {token}"},
+                               json={"make": "Primary", "model": "Fresh", "model_year": 2024, "color": "Red", "customer_id": self.customer_id})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("db_primary_until", response.headers["Set-Cookie"])
+
+        # The writer reads its own write from the primary; other clients keep using the replica
+        self.assertEqual([car["make"] for car in client.get("/cars/").get_json()["cars"]], ["Primary"])
+        self.assertEqual([car["make"] for car in app.test_client().get("/cars/").get_json()["cars"]], ["Replica"])
+
+        # Cache fills always come from the primary
+        self.assertEqual(app.test_client().get("/cars/1").get_json()["make"], "Primary")
+
+    def test_lagging_or_unreachable_replica_falls_back_to_primary(self):
+        with self.app.app_context():
+            db.session.add(Car(make="Primary", model="Fresh", model_year=2024, color="Red", customer_id=self.customer_id))
+            db.session.commit()
+
+        lagging = self.replica_app(REPLICA_MAX_LAG_SECONDS=5, REPLICA_LAG_PROBE=lambda conn: 30)
+        self.assertEqual(lagging.test_client().get("/cars/").get_json()["cars"][0]["make"], "Primary")
+
+        def unreachable(conn):
+            raise OSError("replica down")
+        broken = self.replica_app(REPLICA_LAG_PROBE=unreachable)
+        with self.assertLogs("app.utils.replica", level="ERROR"):
+            self.assertEqual(broken.test_client().get("/cars/").get_json()["cars"][0]["make"], "Primary")
+
+        caught_up = self.replica_app(REPLICA_LAG_PROBE=lambda conn: 0)
+        self.assertEqual(caught_up.test_client().get("/cars/").get_json()["cars"][0]["make"], "Replica")
+
+    def test_instrumentation_reports_timings_and_metrics(self):
+        app = self.create_app(PERF_INSTRUMENTATION=True, SLOW_QUERY_MS=0)
+        client = app.test_client()
+        with app.app_context():
+            car = Car(make="Honda", model="Civic", model_year=2021, color="Blue", customer_id=self.customer_id)
+            db.session.add(car)
+            db.session.commit()
+            car_id = car.id
+
+        with self.assertLogs("app.utils.instrumentation", level="WARNING") as logs:
+            response = client.get("/cars/")
+        self.assertIn("Slow query", logs.output[0])
+        timing = response.headers["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertIn("serialize;dur=", timing)
+
+        self.assertIn('cache;desc="miss"', client.get(f"/cars/{car_id}").headers["Server-Timing"])
+        self.assertIn('cache;desc="hit"', client.get(f"/cars/{car_id}").headers["Server-Timing"])
+
+        self.assertEqual(client.get("/metrics").status_code, 401)
+        self.assertEqual(client.get("/metrics", headers={"Authorization": f"Bearer {make_token(1, 'customer')}"}).status_code, 403)
+        metrics = client.get("/metrics", headers={"Authorization": f"Bearer {make_token(1, 'mechanic')}"}).get_data(as_text=True)
+        self.assertIn("# Counters for worker process", metrics)
+        self.assertIn('http_requests_total{endpoint="cars_bp.get_cars",method="GET",status="200"} 1', metrics)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="cars_bp.get_car",method="GET",status="200",le="+Inf"} 2', metrics)
+        self.assertIn('cache_lookups_total{endpoint="cars_bp.get_car",result="hit"} 1', metrics)
+        self.assertIn('cache_lookups_total{endpoint="cars_bp.get_car",result="miss"} 1', metrics)
+        self.assertRegex(metrics, r"db_slow_queries_total [1-9]")
+
+    def test_metrics_scraped_with_token(self):
+        client = self.create_app(PERF_INSTRUMENTATION=True, METRICS_TOKEN="scrape-me").test_client()
+        self.assertEqual(client.get("/metrics").status_code, 401)
+        self.assertEqual(client.get("/metrics", headers={"Authorization": f"Bearer {make_token(1, 'mechanic')}"}).status_code, 401)
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("http_requests_total", response.get_data(as_text=True))
+
+    def test_instrumentation_disabled_by_default(self):
+        response = self.client.get("/cars/")
+        self.assertNotIn("Server-Timing", response.headers)
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertNotIsInstance(self.app.json, TimedJSONProvider)
+        with self.app.app_context():
+            self.assertFalse(db.engine.dispatch.after_cursor_execute)
@@ -1,21 +1,23 @@
-from app import create_app
-from app.models import db, Customer
-import unittest
-from app.utils.util import encode_token
-from werkzeug.security import generate_password_hash
+from itertools import combinations
+from unittest import mock
+from sqlalchemy import select
+from app.extensions import limiter
+from app.models import db, Customer, Car
+from app.blueprints.customers.schemas import customer_schema, customers_schema, customer_rows
+from app.utils import passwords
+from app.utils.serializers import MAX_NARROWED, narrow_schema, _narrowed_schema
+from helpers import AppTestCase, count_queries, password_hash, make_token
 
-class TestCustomer(unittest.TestCase):
+class TestCustomer(AppTestCase):
     def setUp(self):
-        self.app = create_app("TestingConfig")
-        self.customer = Customer(name="John Doe", email="dj@email.com", address="123 Main St", password=generate_password_hash("123"), role="customer", phone="111-222-3333")
+        super().setUp()
+        # Hashed with werkzeug's default method, so the first login upgrades it to the configured one
+        self.customer = Customer(name="John Doe", email="dj@email.com", address="123 Main St", password=password_hash("123", "scrypt"), role="customer", phone="111-222-3333")
         with self.app.app_context():
-            db.drop_all()
-            db.create_all()
             db.session.add(self.customer)
             db.session.commit()
             self.customer_id = self.customer.id
-        self.token = encode_token(1, "customer")
-        self.client = self.app.test_client()
+        self.token = make_token(1, "customer")
         
     def test_create_customer(self):
         customer_payload = {
@@ -55,6 +57,17 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(response.json['Status'],'success')
         return response.json['auth_token']
     
+    def test_login_returns_503_when_hashing_times_out(self):
+        client = self.create_app(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=1, PASSWORD_HASH_TIMEOUT=0.001).test_client()
+        response = client.post('/customers/login', json={"email": "dj@email.com", "password": "123", "role": "customer"})
+        self.assertEqual(response.status_code, 503)
+        self.addCleanup(passwords._reset_pool, passwords._pool)
+
+        # The abandoned hash keeps the only slot until the worker process finishes it
+        self.assertFalse(passwords._slots.acquire(blocking=False))
+        self.assertTrue(passwords._slots.acquire(timeout=10))
+        passwords._slots.release()
+
     def test_invalid_login(self):
         credentials = {
             "email": "bad_email@email.com",
@@ -138,8 +151,6 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(car_data['customer_id'], self.customer_id)
         
     def test_get_cars_for_customer(self):
-        from app.models import Car
-        
         with self.app.app_context():
             db.session.add(Car(
                 make="Honda",
@@ -160,4 +171,156 @@ class TestCustomer(unittest.TestCase):
         self.assertEqual(car['model'], "Civic")
         self.assertEqual(car['model_year'], 2020)
         self.assertEqual(car['color'], "Red")
-        self.assertEqual(car['customer_id'], self.customer_id)
\ No newline at end of file
+        self.assertEqual(car['customer_id'], self.customer_id)
+
+    def test_get_cars_for_missing_customer(self):
+        response = self.client.get('/customers/99999/cars')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['message'], "Customer not found")
+
+    def rate_limited_client(self, strategy):
+        # The module-level Limiter keeps the strategy of the first app it was initialised with
+        with mock.patch.object(limiter, "_strategy", None):
+            client = self.create_app(RATELIMIT_STRATEGY=strategy).test_client()
+        self.addCleanup(self.create_app)
+        return client
+
+    def test_delete_customer_rate_limited_with_moving_window(self):
+        client = self.rate_limited_client("moving-window")
+        statuses = [client.delete('/customers/9999').status_code for _ in range(4)]
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+    def test_moving_window_rejects_burst_across_window_boundary(self):
+        day = 24 * 60 * 60
+        statuses = {}
+        for strategy in ("fixed-window", "moving-window"):
+            client = self.rate_limited_client(strategy)
+            clock = [1_700_000_000.0]
+            with mock.patch("time.time", lambda: clock[0]):
+                client.delete('/customers/9999')
+                # Two requests just before the first window ends and two just after it
+                clock[0] += day - 1
+                burst = [client.delete('/customers/9999').status_code for _ in range(2)]
+                clock[0] += 2
+                burst += [client.delete('/customers/9999').status_code for _ in range(2)]
+            statuses[strategy] = burst
+        # A fixed window starts counting afresh; the moving window still sees the two from a moment ago
+        self.assertEqual(statuses["fixed-window"], [400, 400, 400, 400])
+        self.assertEqual(statuses["moving-window"], [400, 400, 400, 429])
+
+    def test_process_local_rate_limits_warn_outside_debug(self):
+        with self.assertLogs("app.extensions", level="WARNING") as logs:
+            self.create_app(DEBUG=False)
+        self.assertIn("each worker counts requests separately", logs.output[0])
+        with self.assertNoLogs("app.extensions", level="WARNING"):
+            self.create_app(DEBUG=False, RATELIMIT_STORAGE_URI="memory://", TESTING=True)
+
+    def test_login_rehashes_password_with_configured_method(self):
+        with self.app.app_context():
+            self.assertTrue(db.session.get(Customer, self.customer_id).password.startswith("scrypt:"))
+
+        self.login_member()
+
+        with self.app.app_context():
+            self.assertTrue(db.session.get(Customer, self.customer_id).password.startswith("pbkdf2:sha256:1000$"))
+
+        self.login_member()
+
+    def test_signup_and_login_through_hashing_pool(self):
+        client = self.create_app(PASSWORD_HASH_WORKERS=1).test_client()
+        payload = {
+            "name": "Pool User",
+            "email": "pool@email.com",
+            "address": "1 Pool St",
+            "password": "secret",
+            "role": "customer",
+            "phone": "111-222-3333"
+        }
+
+        self.assertEqual(client.post('/customers/', json=payload).status_code, 201)
+        response = client.post('/customers/login', json={"email": "pool@email.com", "password": "secret", "role": "customer"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("auth_token", response.json)
+
+    def test_export_customers_omits_passwords(self):
+        token = make_token(1, "mechanic")
+        response = self.client.get('/customers/export?format=ndjson', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('dj@email.com', lines[0])
+        self.assertNotIn('password', lines[0])
+
+    def test_row_serializer_matches_schema_dump(self):
+        with self.app.app_context():
+            customer = db.session.get(Customer, 1)
+            db.session.add(Car(make="Mazda", model="3", model_year=2020, color="Red", customer=customer))
+            db.session.add(Car(make="Kia", model="Rio", model_year=2018, color="Blue", customer=customer))
+            db.session.add(Customer(name="No Cars", email="nocars@email.com", phone="555", address="1 Rd", password="x", role="customer"))
+            db.session.commit()
+
+            stmt = select(Customer).order_by(Customer.id)
+            expected = self.app.json.dumps(customers_schema.dump(db.session.execute(stmt).scalars().all()))
+            actual = self.app.json.dumps(customer_rows.dump(db.session.execute(customer_rows.project(stmt)).all()))
+            self.assertEqual(actual, expected)
+
+    def test_sparse_fieldsets(self):
+        with self.app.app_context():
+            db.session.add(Car(make="Mazda", model="3", model_year=2020, color="Red", customer_id=self.customer_id))
+            db.session.add(Customer(name="Amy", email="amy@email.com", phone="555", address="1 Rd", password="x", role="customer"))
+            db.session.commit()
+            engine = db.engine
+
+        with count_queries(engine) as statements:
+            response = self.client.get('/customers/?fields=id,name&sort=name&per_page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['customers'], [{'id': 2, 'name': 'Amy'}])
+        # Validator, COUNT and the page itself; no query for the cars nobody asked for, and no password column
+        self.assertEqual(len(statements), 3)
+        self.assertNotIn('password', statements[2])
+
+        response = self.client.get(f"/customers/?fields=name&sort=name&cursor={response.json['next_cursor']}")
+        self.assertEqual(response.json['customers'], [{'name': 'John Doe'}])
+
+        response = self.client.get('/customers/?fields=name,cars')
+        self.assertEqual(response.json['customers'][0]['cars'][0]['make'], 'Mazda')
+
+        with count_queries(engine) as statements:
+            response = self.client.get(f'/customers/{self.customer_id}?fields=email')
+        self.assertEqual(response.json, {'email': self.customer.email})
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('password', statements[1])
+
+        response = self.client.get(f'/customers/{self.customer_id}/cars?fields=make,model')
+        self.assertEqual(response.json, [{'make': 'Mazda', 'model': '3'}])
+
+        for url in ('/customers/?fields=salary', f'/customers/{self.customer_id}?fields=', f'/customers/{self.customer_id}/cars?fields=name'):
+            self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_narrowed_serializers_are_bounded(self):
+        names = ["id", "name", "email", "phone", "address", "role"]
+        for size in range(1, len(names) + 1):
+            for subset in combinations(names, size):
+                self.assertEqual(self.client.get(f"/customers/?fields={','.join(subset)}").status_code, 200)
+        self.assertEqual(len(customer_rows._narrowed), MAX_NARROWED)
+
+        _narrowed_schema.cache_clear()
+        for subset in combinations(names, 3):
+            self.assertEqual(self.client.get(f"/customers/{self.customer_id}?fields={','.join(subset)}").status_code, 200)
+        self.assertIs(narrow_schema(customer_schema, {"name", "email"}), narrow_schema(customer_schema, frozenset(["email", "name"])))
+        self.assertLessEqual(_narrowed_schema.cache_info().currsize, _narrowed_schema.cache_info().maxsize)
+
+    def test_conditional_get_on_customer_cars(self):
+        response = self.client.get(f'/customers/{self.customer_id}/cars')
+        etag = response.headers['ETag']
+        self.assertEqual(self.client.get(f'/customers/{self.customer_id}/cars', headers={'If-None-Match': etag}).status_code, 304)
+
+        with self.app.app_context():
+            db.session.add(Car(make="Mazda", model="3", model_year=2020, color="Red", customer_id=self.customer_id))
+            db.session.commit()
+
+        response = self.client.get(f'/customers/{self.customer_id}/cars', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 1)
+        self.assertNotEqual(response.headers['ETag'], etag)
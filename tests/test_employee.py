@@ -1,26 +1,22 @@
-import unittest
-from app import create_app
-from app.models import db, Employee
-from werkzeug.security import generate_password_hash
+from datetime import date
+from app.models import db, Employee, ServiceTicket, Customer, Car
+from helpers import AppTestCase, password_hash, make_token
 
-class TestEmployee(unittest.TestCase):
+class TestEmployee(AppTestCase):
     def setUp(self):
-        self.app = create_app("TestingConfig")
-        self.client = self.app.test_client()
+        super().setUp()
         
         self.employee = Employee(
             name = "Jane Doe",
             email = "Jane@email.com",
             address = "101 Main St",
             phone = "111-222-3333",
-            password = generate_password_hash("1234"),
+            password = password_hash("1234"),
             salary = 60000,
             role = "mechanic"
         )
         
         with self.app.app_context():
-            db.drop_all()
-            db.create_all()
             db.session.add(self.employee)
             db.session.commit()
             self.employee_id = self.employee.id
@@ -94,8 +90,7 @@ class TestEmployee(unittest.TestCase):
         self.assertEqual(response.json['message'], "Employee not found")
         
     def test_update_employee(self):
-        from app.utils.util import encode_token
-        token = encode_token(self.employee_id, "mechanic")
+        token = make_token(self.employee_id, "mechanic")
         headers = {'Authorization': f'Bearer {token}'}
         
         update_payload = {
@@ -120,8 +115,7 @@ class TestEmployee(unittest.TestCase):
         self.assertEqual(response.json['phone'], "999-888-7777")
         
     def test_delete_employee(self):
-        from app.utils.util import encode_token
-        token = encode_token(self.employee_id, "mechanic")
+        token = make_token(self.employee_id, "mechanic")
         headers = {'Authorization': f'Bearer {token}'}
         
         response = self.client.delete(f'/employees/{self.employee_id}', headers=headers)
@@ -134,8 +128,6 @@ class TestEmployee(unittest.TestCase):
         self.assertEqual(follow_up.status_code, 404)
         
     def test_get_employees_working_tickets(self):
-        from app.models import ServiceTicket, Customer, Car
-        from datetime import date
         
         with self.app.app_context():
             
@@ -144,7 +136,7 @@ class TestEmployee(unittest.TestCase):
                 email = "testcustomer@email.com",
                 address = "123 Main St",
                 phone = "111-222-3333",
-                password = generate_password_hash("password"),
+                password = password_hash("password"),
                 role = "customer"
             )
             db.session.add(customer)
@@ -187,4 +179,55 @@ class TestEmployee(unittest.TestCase):
         self.assertEqual(mechanic["name"], self.employee.name)
         self.assertEqual(mechanic["ticket_count"], 1)
         self.assertIsInstance(mechanic["ticket_ids"], list)
-        self.assertEqual(len(mechanic["ticket_ids"]), 1)
\ No newline at end of file
+        self.assertEqual(len(mechanic["ticket_ids"]), 1)
+
+    def test_working_tickets_ordering_limit_and_date_range(self):
+        with self.app.app_context():
+            customer = Customer(name="C", email="c@email.com", address="1 St", phone="1", password="x", role="customer")
+            db.session.add(customer)
+            db.session.commit()
+            car = Car(make="Honda", model="Civic", model_year=2022, color="Blue", customer_id=customer.id)
+            db.session.add(car)
+            db.session.commit()
+
+            busy = Employee(name="Busy", email="busy@email.com", address="1 St", phone="1", password="x", salary=1, role="mechanic")
+            idle = Employee(name="Idle", email="idle@email.com", address="1 St", phone="1", password="x", salary=1, role="mechanic")
+            db.session.add_all([busy, idle])
+
+            jane = db.session.get(Employee, self.employee_id)
+            for day in [1, 2, 3]:
+                ticket = ServiceTicket(service_date=date(2025, 6, day), customer_id=customer.id, car_id=car.id, VIN=str(day), is_major_damage=False)
+                busy.tickets.append(ticket)
+                if day == 1:
+                    jane.tickets.append(ticket)
+            db.session.commit()
+            busy_id = busy.id
+
+        data = self.client.get('/employees/working_tickets').json
+        self.assertEqual([m["name"] for m in data], ["Busy", "Jane Doe"])
+        self.assertEqual(data[0]["ticket_count"], 3)
+        self.assertEqual(len(data[0]["ticket_ids"]), 3)
+
+        data = self.client.get('/employees/working_tickets?limit=1').json
+        self.assertEqual([m["id"] for m in data], [busy_id])
+
+        data = self.client.get('/employees/working_tickets?from=2025-06-02&to=2025-06-03').json
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["ticket_count"], 2)
+        self.assertEqual(len(data[0]["ticket_ids"]), 2)
+
+        response = self.client.get('/employees/working_tickets?from=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_route_with_malformed_authorization_header(self):
+        for header in ["Bearer", "Token abc", "Bearer "]:
+            response = self.client.delete(f'/employees/{self.employee_id}', headers={'Authorization': header})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json['message'], "Token is missing")
+
+    def test_admin_route_rejects_customer_token_after_caching(self):
+        headers = {'Authorization': f'Bearer {make_token(self.employee_id, "customer")}'}
+
+        for _ in range(2):
+            response = self.client.delete(f'/employees/{self.employee_id}', headers=headers)
+            self.assertEqual(response.status_code, 403)
@@ -0,0 +1,184 @@
+from datetime import date, timedelta
+from unittest import mock
+from sqlalchemy import select, func
+from app.models import db, Employee, ServiceType, Customer, Car, ServiceTicket, ReportRollup, utcnow
+from app.utils import rollups
+from helpers import AppTestCase, count_queries, password_hash, make_token
+
+class TestReports(AppTestCase):
+    def setUp(self):
+        super().setUp()
+
+        with self.app.app_context():
+            self.mechanics = [
+                Employee(name=name, email=f"{name.lower()}@example.com", password=password_hash("123"),
+                         address="Shop", phone="111-222-3333", role="mechanic", salary=60000)
+                for name in ["Ana", "Ben"]
+            ]
+            self.customers = [
+                Customer(name=name, email=f"{name.lower()}@email.com", address="1 Main St", phone="555-0000",
+                         password=password_hash("123456"), role="customer")
+                for name in ["Carla", "Dave"]
+            ]
+            self.oil = ServiceType(name="Oil Change", price=30)
+            self.brakes = ServiceType(name="Brake Inspection", price=45.5)
+            db.session.add_all(self.mechanics + self.customers + [self.oil, self.brakes])
+            db.session.commit()
+
+            self.cars = [Car(make="Honda", model="Civic", model_year=2020, color="Blue", customer_id=c.id) for c in self.customers]
+            db.session.add_all(self.cars)
+            db.session.commit()
+
+            ana, ben = self.mechanics
+            carla, dave = self.customers
+            tickets = []
+            for service_date, customer, services, mechanics in [
+                (date(2024, 1, 3), carla, [self.oil], [ana]),
+                (date(2024, 1, 17), carla, [self.oil, self.brakes], [ana, ben]),
+                (date(2024, 2, 5), dave, [self.brakes], [ben]),
+                (date(2024, 2, 6), dave, [], []),
+            ]:
+                with db.session.no_autoflush:
+                    tickets.append(ServiceTicket(service_date=service_date, customer_id=customer.id,
+                                                 car_id=self.cars[self.customers.index(customer)].id, VIN="VIN",
+                                                 services=services, employee=mechanics))
+            db.session.add_all(tickets)
+            db.session.commit()
+
+            self.ids = {"ana": ana.id, "ben": ben.id, "carla": carla.id, "dave": dave.id,
+                        "oil": self.oil.id, "brakes": self.brakes.id, "car": self.cars[0].id, "unserviced": tickets[-1].id}
+
+        self.auth_header = {"Authorization": f"Bearer {make_token(user_id=self.ids['ana'], role='mechanic')}"}
+
+    def get(self, path):
+        return self.client.get(path, headers=self.auth_header)
+
+    def test_revenue_by_month_and_service_type(self):
+        response = self.get("/reports/revenue?period=month&from=2024-01-01&to=2024-03-31")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([(r["period_start"], r["tickets"], r["revenue"]) for r in data["revenue"]],
+                         [("2024-01-01", 2, 105.5), ("2024-02-01", 2, 45.5), ("2024-03-01", 0, 0)])
+        self.assertEqual((data["total_tickets"], data["total_revenue"]), (4, 151.0))
+
+        data = self.get("/reports/revenue?period=month&from=2024-01-01&to=2024-03-31&by=service_type").get_json()
+        self.assertEqual([(r["period_start"], r["name"], r["tickets"], r["revenue"]) for r in data["revenue"]], [
+            ("2024-01-01", "Oil Change", 2, 60.0),
+            ("2024-01-01", "Brake Inspection", 1, 45.5),
+            ("2024-02-01", "Brake Inspection", 1, 45.5),
+        ])
+
+        data = self.get("/reports/revenue?period=week&from=2024-01-01&to=2024-01-21").get_json()
+        self.assertEqual([(r["period_start"], r["tickets"]) for r in data["revenue"]],
+                         [("2024-01-01", 1), ("2024-01-08", 0), ("2024-01-15", 1)])
+
+    def test_completed_days_are_served_from_rollups(self):
+        self.get("/reports/revenue?period=day&from=2024-01-01&to=2024-02-29")
+        with self.app.app_context():
+            rolled_up = db.session.execute(select(func.count()).select_from(ReportRollup)
+                                           .where(ReportRollup.subject_id == 0)).scalar()
+            self.assertEqual(rolled_up, 60)
+
+            with count_queries(db.engine) as statements:
+                data = self.get("/reports/revenue?period=month&from=2024-01-01&to=2024-02-29").get_json()
+            self.assertFalse([s for s in statements if "service_ticket" in s or "ticket_service" in s])
+            self.assertEqual(data["total_revenue"], 151.0)
+
+        # Writing a ticket on a rolled-up day drops that day, so the next read rebuilds it
+        self.client.put(f"/service_types/{self.ids['brakes']}/assign_service_type/{self.ids['unserviced']}", headers=self.auth_header)
+        data = self.get("/reports/revenue?period=month&from=2024-01-01&to=2024-02-29").get_json()
+        self.assertEqual(data["total_revenue"], 196.5)
+
+        self.client.put(f"/service_types/{self.ids['oil']}", json={"name": "Oil Change", "price": 35}, headers=self.auth_header)
+        data = self.get("/reports/revenue?period=month&from=2024-01-01&to=2024-02-29&by=service_type").get_json()
+        self.assertEqual(data["revenue"][0]["revenue"], 70.0)
+        self.assertEqual(data["total_revenue"], 206.5)
+
+        tickets = [{"service_date": "2024-01-20", "customer_id": self.ids["carla"], "car_id": self.ids["car"],
+                    "VIN": "LATE", "service_type_ids": [self.ids["oil"]]}]
+        self.client.post("/tickets/bulk", json=tickets, headers=self.auth_header)
+        data = self.get("/reports/revenue?period=month&from=2024-01-01&to=2024-01-31").get_json()
+        self.assertEqual((data["total_tickets"], data["total_revenue"]), (3, 150.5))
+
+    def test_build_report_rollups_command(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["build-report-rollups", "--to", "2024-01-31"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("revenue: 32 rows for 2024-01-03 to 2024-01-31", result.output)
+        self.assertIn("revenue: 0 rows", runner.invoke(args=["build-report-rollups", "--to", "2024-01-31"]).output)
+        self.assertIn("revenue: 32 rows", runner.invoke(args=["build-report-rollups", "--to", "2024-01-31", "--rebuild"]).output)
+
+    def test_materialize_retries_days_another_request_rolled_up(self):
+        with self.app.app_context():
+            stale = rollups._missing_spans("revenue", date(2024, 1, 1), date(2024, 1, 31))
+            # A concurrent request rolls up Jan 17 between our missing-days check and our insert
+            rollups.materialize("revenue", date(2024, 1, 17), date(2024, 1, 17))
+            real = rollups._missing_spans
+            calls = []
+
+            def missing_spans(*args):
+                calls.append(args)
+                return stale if len(calls) == 1 else real(*args)
+
+            with mock.patch.object(rollups, "_missing_spans", missing_spans):
+                self.assertEqual(rollups.materialize("revenue", date(2024, 1, 1), date(2024, 1, 31)), 31)
+            self.assertEqual(len(calls), 2)
+
+            days = db.session.execute(select(func.count()).select_from(ReportRollup).where(
+                ReportRollup.subject_id == 0, ReportRollup.day.between(date(2024, 1, 1), date(2024, 1, 31)))).scalar()
+            self.assertEqual(days, 31)
+
+        with mock.patch.object(rollups, "materialize", return_value=0):
+            data = self.get("/reports/revenue?period=month&from=2024-02-01&to=2024-02-29").get_json()
+        self.assertEqual((data["total_tickets"], data["total_revenue"]), (2, 45.5))
+
+    def test_today_is_computed_live(self):
+        today = utcnow().date()
+        response = self.client.post("/tickets/", json={
+            "service_date": str(today), "customer_id": self.ids["dave"], "car_id": self.ids["car"], "VIN": "TODAY",
+            "service_type_ids": [self.ids["oil"]]
+        }, headers=self.auth_header)
+        self.assertEqual(response.status_code, 201)
+
+        data = self.get(f"/reports/revenue?period=day&from={today - timedelta(days=1)}&to={today}").get_json()
+        self.assertEqual([r["revenue"] for r in data["revenue"]], [0, 30.0])
+        with self.app.app_context():
+            days = set(db.session.execute(select(ReportRollup.day)).scalars())
+        self.assertEqual(days, {today - timedelta(days=1)})
+
+    def test_mechanic_load(self):
+        data = self.get("/reports/mechanic-load?period=month&from=2024-01-01&to=2024-02-29").get_json()
+        self.assertEqual([(r["period_start"], r["name"], r["tickets"], r["services"]) for r in data["mechanics"]], [
+            ("2024-01-01", "Ana", 2, 3),
+            ("2024-01-01", "Ben", 1, 2),
+            ("2024-02-01", "Ben", 1, 1),
+        ])
+
+        data = self.get(f"/reports/mechanic-load?period=month&from=2024-01-01&to=2024-02-29&employee_id={self.ids['ana']}").get_json()
+        self.assertEqual({r["name"] for r in data["mechanics"]}, {"Ana"})
+
+        self.client.delete(f"/employees/{self.ids['ben']}", headers=self.auth_header)
+        data = self.get("/reports/mechanic-load?period=month&from=2024-01-01&to=2024-02-29").get_json()
+        self.assertEqual({r["name"] for r in data["mechanics"]}, {"Ana"})
+
+    def test_customer_lifetime(self):
+        response = self.get("/reports/customer-lifetime")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["customers"], [
+            {"customer_id": self.ids["carla"], "name": "Carla", "tickets": 2, "services": 3, "total_spent": 105.5,
+             "first_visit": "2024-01-03", "last_visit": "2024-01-17"},
+            {"customer_id": self.ids["dave"], "name": "Dave", "tickets": 2, "services": 1, "total_spent": 45.5,
+             "first_visit": "2024-02-05", "last_visit": "2024-02-06"},
+        ])
+
+        etag = response.headers["ETag"]
+        self.assertEqual(self.client.get("/reports/customer-lifetime", headers=dict(self.auth_header, **{"If-None-Match": etag})).status_code, 304)
+        self.assertEqual(len(self.get(f"/reports/customer-lifetime?customer_id={self.ids['dave']}").get_json()["customers"]), 1)
+
+    def test_report_argument_errors(self):
+        self.assertEqual(self.client.get("/reports/revenue").status_code, 401)
+        for path in ["/reports/revenue?period=year", "/reports/revenue?from=2024-02-01&to=2024-01-01",
+                     "/reports/revenue?by=customer", "/reports/revenue?from=2000-01-01&to=2024-01-01",
+                     "/reports/mechanic-load?employee_id=x", "/reports/customer-lifetime?limit=0",
+                     "/reports/customer-lifetime?limit=1000"]:
+            self.assertEqual(self.get(path).status_code, 400, path)
@@ -1,23 +1,53 @@
-import unittest
-from app import create_app
-from app.models import db, Employee, Car, ServiceTicket, ServiceType, Customer
-from werkzeug.security import generate_password_hash
+import json
+import threading
 from datetime import date
-from app.utils.util import encode_token
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from sqlalchemy import select, func, update
+from sqlalchemy.exc import OperationalError
+from app.extensions import cache
+from app.models import (db, Employee, Car, ServiceTicket, ServiceType, Customer, OutboxMessage, mechanic_ticket,
+                        ticket_service, repair_ticket_totals)
+from app.blueprints.Service_Ticket.schemas import service_tickets_schema, service_ticket_rows
+from app.utils import outbox
+from app.utils.outbox import dispatch_batch, run_worker
+from app.utils.pagination import encode_cursor
+from helpers import AppTestCase, count_queries, password_hash, make_token
 
-class TestServiceTicket(unittest.TestCase):
+class SisterSiteStub:
+    def __init__(self):
+        self.received = []
+        self.status = 200
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if stub.status == 200:
+                    stub.received.append(json.loads(body))
+                self.send_response(stub.status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/tickets"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TestServiceTicket(AppTestCase):
     def setUp(self):
-        self.app = create_app("TestingConfig")
-        self.client = self.app.test_client()
+        super().setUp()
         
         with self.app.app_context():
-            db.drop_all()
-            db.create_all()
-            
             self.employee = Employee(
                 name = "John Smith",
                 email = "john@example.com",
-                password = generate_password_hash("123"),
+                password = password_hash("123"),
                 address = "123 Main St",
                 phone = "111-222-3333",
                 role = "mechanic",
@@ -31,7 +61,7 @@ class TestServiceTicket(unittest.TestCase):
                 email = "customer@email.com",
                 address = "123 Main St",
                 phone = "111-222-3333",
-                password = generate_password_hash("123456"),
+                password = password_hash("123456"),
                 role = "customer"
             )
             
@@ -63,7 +93,7 @@ class TestServiceTicket(unittest.TestCase):
             self.service_type_id = self.service_type.id
             self.employee_id = self.employee.id
             
-            self.token = encode_token(user_id = self.employee_id, role = "mechanic")
+            self.token = make_token(user_id = self.employee_id, role = "mechanic")
             self.auth_header = {
                 "Authorization": f"Bearer {self.token}"
             }
@@ -185,7 +215,7 @@ class TestServiceTicket(unittest.TestCase):
 
     def test_get_ticket_by_id_not_found(self):
         response = self.client.get("/tickets/99999")  
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, 404)
         data = response.get_json()
         self.assertIn("message", data)
         self.assertEqual(data["message"], "Ticket not found")
@@ -324,3 +354,465 @@ class TestServiceTicket(unittest.TestCase):
         with self.app.app_context():
             updated_ticket = db.session.get(ServiceTicket, ticket_id)
             self.assertEqual(len(updated_ticket.employee), 0)
+
+    def test_get_tickets_cursor_by_service_date(self):
+        with self.app.app_context():
+            for day in [5, 1, 3, 1, 4]:
+                db.session.add(ServiceTicket(
+                    service_date=date(2025, 6, day),
+                    customer_id=self.customer_id,
+                    car_id=self.car_id,
+                    VIN=f"DAY{day}",
+                    car_issue="Cursor paging",
+                    is_major_damage=False
+                ))
+            db.session.commit()
+
+        seen = []
+        response = self.client.get("/tickets/?sort=service_date&per_page=2&page=1")
+        data = response.get_json()
+        seen.extend(t["service_date"] for t in data["tickets"])
+        cursor = data["next_cursor"]
+
+        while cursor:
+            response = self.client.get(f"/tickets/?sort=service_date&per_page=2&cursor={cursor}")
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            seen.extend(t["service_date"] for t in data["tickets"])
+            cursor = data["next_cursor"]
+
+        self.assertEqual(seen, ["2025-06-01", "2025-06-01", "2025-06-03", "2025-06-04", "2025-06-05"])
+
+    def test_get_tickets_invalid_cursor(self):
+        response = self.client.get("/tickets/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["message"], "Invalid cursor")
+
+        # Well-formed tokens whose values don't match the sort column's type
+        for sort, value, last_id in [("total_price", [1], 1), ("total_price", "12.5", 1), ("service_date", {}, 1),
+                                     ("id", 0, [1]), ("id", 0, True)]:
+            cursor = encode_cursor(sort, value, last_id)
+            response = self.client.get(f"/tickets/?sort={sort}&cursor={cursor}")
+            self.assertEqual(response.status_code, 400, (sort, value, last_id))
+            self.assertEqual(response.get_json()["message"], "Invalid cursor")
+        response = self.client.get(f"/cars/?sort=make&cursor={encode_cursor('make', {'a': 1}, 1)}")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/tickets/?sort=total_price&cursor={encode_cursor('total_price', 12, 1)}").status_code, 200)
+
+    def test_get_ticket_cache_evicted_on_service_change(self):
+        with self.app.app_context():
+            ticket = ServiceTicket(
+                service_date=date.today(),
+                customer_id=self.customer_id,
+                car_id=self.car_id,
+                VIN="CACHE123",
+                car_issue="Cached",
+                is_major_damage=False
+            )
+            db.session.add(ticket)
+            db.session.commit()
+            ticket_id = ticket.id
+
+        self.assertEqual(self.client.get(f"/tickets/{ticket_id}").get_json()["services"], [])
+
+        self.client.put(f"/service_types/{self.service_type_id}/assign_service_type/{ticket_id}", headers=self.auth_header)
+        self.assertEqual(len(self.client.get(f"/tickets/{ticket_id}").get_json()["services"]), 1)
+
+        self.client.put(f"/service_types/{self.service_type_id}", json={"name": "Synthetic Oil Change", "price": 79.99}, headers=self.auth_header)
+        data = self.client.get(f"/tickets/{ticket_id}").get_json()
+        self.assertEqual(data["services"][0]["name"], "Synthetic Oil Change")
+
+
+    def test_major_damage_ticket_delivered_through_outbox(self):
+        sister_site = SisterSiteStub()
+        self.addCleanup(sister_site.close)
+        self.app.config["SISTER_SITE_URL"] = sister_site.url
+
+        payload = {
+            "service_date": str(date.today()),
+            "customer_id": self.customer_id,
+            "car_id": self.car_id,
+            "VIN": "WRECK1",
+            "car_issue": "Frame damage",
+            "is_major_damage": True
+        }
+        response = self.client.post("/tickets/", json=payload, headers=self.auth_header)
+        self.assertEqual(response.status_code, 201)
+        ticket_id = response.get_json()["ticket"]["id"]
+
+        with self.app.app_context():
+            message = db.session.execute(db.select(OutboxMessage)).scalar_one()
+            self.assertEqual(message.payload["id"], ticket_id)
+            self.assertIsNone(message.delivered_at)
+
+            sister_site.status = 503
+            self.assertEqual(dispatch_batch(), (1, 0))
+            message = db.session.get(OutboxMessage, message.id)
+            self.assertEqual(message.attempts, 1)
+            self.assertIsNone(message.delivered_at)
+            self.assertGreater(message.next_attempt_at, message.created_at)
+
+            self.assertEqual(dispatch_batch(), (0, 0))
+            self.assertEqual(db.session.get(OutboxMessage, message.id).attempts, 1)
+
+            message.next_attempt_at = message.created_at
+            db.session.commit()
+            sister_site.status = 200
+            self.assertEqual(run_worker(once=True), 1)
+            self.assertIsNotNone(db.session.get(OutboxMessage, message.id).delivered_at)
+
+        self.assertEqual(sister_site.received[0]["tickets"][0]["VIN"], "WRECK1")
+
+    def test_outbox_dead_letters_and_worker_recovery(self):
+        self.app.config["OUTBOX_MAX_ATTEMPTS"] = 2
+        with self.app.app_context():
+            message = outbox.enqueue(outbox.SISTER_SITE_TOPIC, {"id": 1})
+            db.session.commit()
+
+            def fail(messages):
+                raise OSError("sister site down")
+
+            with self.assertLogs("app.utils.outbox", "ERROR") as logs:
+                for _ in range(2):
+                    db.session.get(OutboxMessage, message.id).next_attempt_at = message.created_at
+                    db.session.commit()
+                    outbox.dispatch_batch(fail)
+            self.assertIn("dead after 2 attempts: sister site down", logs.output[0])
+            self.assertIsNotNone(db.session.get(OutboxMessage, message.id).dead_at)
+
+            runner = self.app.test_cli_runner()
+            self.assertIn("1 dead message(s)", runner.invoke(args=["outbox-dead-letters"]).output)
+            self.assertIn("Requeued 1 message(s)", runner.invoke(args=["outbox-dead-letters", "--retry"]).output)
+            self.assertEqual(outbox.run_worker(once=True, send=lambda messages: None), 1)
+
+            # A database error is rolled back and retried after a pause instead of ending the loop
+            error = OperationalError("SELECT", {}, Exception("server has gone away"))
+            with mock.patch.object(outbox, "dispatch_batch", side_effect=[error, (0, 0), KeyboardInterrupt]), \
+                    mock.patch.object(outbox.time, "sleep") as sleep, self.assertLogs("app.utils.outbox", "ERROR"):
+                with self.assertRaises(KeyboardInterrupt):
+                    outbox.run_worker()
+            self.assertEqual(len(sleep.call_args_list), 2)
+
+            # A batch that only failed goes straight on to the next one instead of sleeping
+            with mock.patch.object(outbox, "dispatch_batch", side_effect=[(2, 0), (1, 1), (0, 0)]), \
+                    mock.patch.object(outbox.time, "sleep") as sleep:
+                self.assertEqual(outbox.run_worker(once=True), 1)
+            sleep.assert_not_called()
+
+    def test_bulk_create_tickets_reports_per_item_errors(self):
+        valid = {
+            "service_date": str(date.today()),
+            "customer_id": self.customer_id,
+            "car_id": self.car_id,
+            "VIN": "BULK",
+            "car_issue": "Imported",
+            "service_type_ids": [self.service_type_id]
+        }
+        tickets = [dict(valid, VIN=f"BULK{i}") for i in range(5)]
+        tickets.insert(2, dict(valid, service_type_ids=[424242]))
+        tickets.insert(4, {"car_id": self.car_id})
+        tickets.append(dict(valid, car_id=99999))
+
+        response = self.client.post("/tickets/bulk", json={"tickets": tickets}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 207)
+
+        data = response.get_json()
+        self.assertEqual(len(data["created"]), 5)
+        self.assertEqual([e["index"] for e in data["errors"]], [2, 4, 7])
+        self.assertEqual(data["errors"][0]["invalid_ids"], [424242])
+        self.assertIn("VIN", data["errors"][1]["errors"])
+        self.assertIn("car_id", data["errors"][2]["errors"])
+
+        with self.app.app_context():
+            created = db.session.get(ServiceTicket, data["created"][0]["id"])
+            self.assertEqual(created.VIN, "BULK0")
+            self.assertEqual([s.id for s in created.services], [self.service_type_id])
+
+    def test_ticket_totals_follow_service_links(self):
+        with self.app.app_context():
+            brakes = ServiceType(name="Brake Inspection", price=40.01)
+            db.session.add(brakes)
+            db.session.commit()
+            brakes_id = brakes.id
+
+        payload = {
+            "service_date": str(date.today()),
+            "customer_id": self.customer_id,
+            "car_id": self.car_id,
+            "VIN": "TOTAL1",
+            "service_type_ids": [self.service_type_id, brakes_id]
+        }
+        ticket = self.client.post("/tickets/", json=payload, headers=self.auth_header).get_json()["ticket"]
+        self.assertEqual((ticket["total_price"], ticket["service_count"]), (100.0, 2))
+        totals = lambda: (lambda t: (t["total_price"], t["service_count"]))(self.client.get(f"/tickets/{ticket['id']}").get_json())
+
+        self.client.put(f"/service_types/{brakes_id}/remove_service_type/{ticket['id']}", headers=self.auth_header)
+        self.assertEqual(totals(), (59.99, 1))
+        self.client.put(f"/service_types/{brakes_id}/assign_service_type/{ticket['id']}", headers=self.auth_header)
+        self.assertEqual(totals(), (100.0, 2))
+
+        response = self.client.put(f"/tickets/{ticket['id']}", json=dict(payload, service_type_ids=[brakes_id], total_price=1),
+                                   headers=self.auth_header)
+        self.assertEqual((response.get_json()["total_price"], response.get_json()["service_count"]), (40.01, 1))
+
+        self.client.put(f"/service_types/{brakes_id}", json={"name": "Brake Inspection", "price": 45}, headers=self.auth_header)
+        self.assertEqual(totals(), (45.0, 1))
+        self.client.delete(f"/service_types/{brakes_id}", headers=self.auth_header)
+        self.assertEqual(totals(), (0.0, 0))
+
+        bulk = self.client.post("/tickets/bulk", json=[dict(payload, VIN="TOTAL2", service_type_ids=[self.service_type_id])], headers=self.auth_header).get_json()
+        with self.app.app_context():
+            created = db.session.get(ServiceTicket, bulk["created"][0]["id"])
+            self.assertEqual((created.total_price, created.service_count), (59.99, 1))
+
+    def test_get_tickets_filter_and_sort_by_total(self):
+        with self.app.app_context():
+            extra = ServiceType(name="Tire Rotation", price=20)
+            db.session.add(extra)
+            for i, services in enumerate([[self.service_type, extra], [], [extra], [self.service_type], [extra]]):
+                db.session.add(ServiceTicket(service_date=date.today(), customer_id=self.customer_id, car_id=self.car_id,
+                                             VIN=f"SORT{i}", services=services))
+            db.session.commit()
+
+        data = self.client.get("/tickets/?min_total=10&max_total=60").get_json()
+        self.assertEqual(sorted(t["VIN"] for t in data["tickets"]), ["SORT2", "SORT3", "SORT4"])
+        self.assertEqual(data["total_tickets"], 3)
+
+        seen = []
+        data = self.client.get("/tickets/?sort=total_price&per_page=2").get_json()
+        seen.extend(t["VIN"] for t in data["tickets"])
+        while data["next_cursor"]:
+            data = self.client.get(f"/tickets/?sort=total_price&per_page=2&cursor={data['next_cursor']}").get_json()
+            seen.extend(t["VIN"] for t in data["tickets"])
+        self.assertEqual(seen, ["SORT1", "SORT2", "SORT4", "SORT3", "SORT0"])
+
+        self.assertEqual(self.client.get("/tickets/?min_total=cheap").status_code, 400)
+        self.assertEqual(self.client.get("/tickets/?min_total=50&max_total=10").status_code, 400)
+
+    def test_repair_ticket_totals_command(self):
+        with self.app.app_context():
+            for vin in ["FIX1", "FIX2"]:
+                db.session.add(ServiceTicket(service_date=date.today(), customer_id=self.customer_id, car_id=self.car_id,
+                                             VIN=vin, services=[self.service_type]))
+            db.session.commit()
+            db.session.execute(update(ServiceTicket).where(ServiceTicket.VIN == "FIX1").values(total_price=None, service_count=None))
+            db.session.execute(update(ServiceTicket).where(ServiceTicket.VIN == "FIX2").values(total_price=12.5))
+            db.session.commit()
+            fix2_id = db.session.execute(db.select(ServiceTicket.id).where(ServiceTicket.VIN == "FIX2")).scalar()
+
+        self.assertEqual(self.client.get(f"/tickets/{fix2_id}").get_json()["total_price"], 12.5)
+        cache.set("unrelated", "kept")
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["repair-ticket-totals", "--dry-run"])
+        self.assertIn("2 ticket(s) have stale totals", result.output)
+        result = runner.invoke(args=["repair-ticket-totals", "--chunk-size", "1"])
+        self.assertIn("Repaired totals on 2 ticket(s)", result.output)
+
+        # Only the repaired tickets' entries are invalidated, not the whole shared cache
+        self.assertEqual(self.client.get(f"/tickets/{fix2_id}").get_json()["total_price"], 59.99)
+        self.assertEqual(cache.get("unrelated"), "kept")
+
+        with self.app.app_context():
+            rows = db.session.execute(db.select(ServiceTicket.total_price, ServiceTicket.service_count)).all()
+            self.assertEqual(set(rows), {(59.99, 1)})
+        self.assertIn("0 ticket(s)", runner.invoke(args=["repair-ticket-totals", "--dry-run"]).output)
+
+    def test_bulk_create_tickets_without_executemany_returning(self):
+        valid = {
+            "service_date": str(date.today()),
+            "customer_id": self.customer_id,
+            "car_id": self.car_id,
+            "VIN": "BULK",
+            "service_type_ids": [self.service_type_id]
+        }
+        tickets = [dict(valid, VIN=f"MYSQL{i}") for i in range(4)]
+        tickets.insert(1, dict(valid, service_type_ids=[[self.service_type_id]]))
+        tickets.insert(3, dict(valid, service_type_ids=[{}, True]))
+
+        with self.app.app_context():
+            engine = db.engine
+        # MySQL's dialect has no executemany RETURNING, so the ids come back through the batch marker
+        with mock.patch.object(engine.dialect, "insert_executemany_returning_sort_by_parameter_order", False), \
+                count_queries(engine) as statements:
+            response = self.client.post("/tickets/bulk", json=tickets, headers=self.auth_header)
+        self.assertEqual(response.status_code, 207)
+
+        data = response.get_json()
+        self.assertEqual([e["index"] for e in data["errors"]], [1, 3])
+        self.assertIn("service_type_ids", data["errors"][0]["errors"])
+        self.assertEqual(len([s for s in statements if s.startswith("INSERT INTO service_ticket ")]), 1)
+
+        with self.app.app_context():
+            for created, vin in zip(data["created"], [f"MYSQL{i}" for i in range(4)]):
+                ticket = db.session.get(ServiceTicket, created["id"])
+                self.assertEqual((ticket.VIN, [s.id for s in ticket.services]), (vin, [self.service_type_id]))
+
+    def test_bulk_create_tickets_rejects_empty_payload(self):
+        response = self.client.post("/tickets/bulk", json={"tickets": []}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_tickets_ndjson_and_csv(self):
+        with self.app.app_context():
+            for day in [1, 10, 20]:
+                db.session.add(ServiceTicket(
+                    service_date=date(2025, 6, day),
+                    customer_id=self.customer_id,
+                    car_id=self.car_id,
+                    VIN=f"EXP{day}",
+                    car_issue="Export",
+                    is_major_damage=False,
+                    services=[db.session.get(ServiceType, self.service_type_id)]
+                ))
+            db.session.commit()
+
+        response = self.client.get("/tickets/export?format=ndjson&from=2025-06-05&to=2025-06-30", headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([r["VIN"] for r in rows], ["EXP10", "EXP20"])
+        self.assertEqual(rows[0]["service_date"], "2025-06-10")
+        self.assertEqual(rows[0]["service_type_ids"], [self.service_type_id])
+
+        response = self.client.get("/tickets/export?format=csv", headers=self.auth_header)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0], "id,service_date,customer_id,car_id,VIN,car_issue,is_major_damage,service_type_ids")
+        self.assertEqual(len(lines), 4)
+
+        response = self.client.get("/tickets/export?format=xml", headers=self.auth_header)
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_ticket_list_and_detail_use_constant_queries(self):
+        with self.app.app_context():
+            brakes = ServiceType(name="Brakes", description="Pads", price=120)
+            db.session.add(brakes)
+            for i in range(30):
+                db.session.add(ServiceTicket(
+                    service_date=date.today(),
+                    customer_id=self.customer_id,
+                    car_id=self.car_id,
+                    VIN=f"NPLUS{i}",
+                    is_major_damage=False,
+                    services=[db.session.get(ServiceType, self.service_type_id), brakes]
+                ))
+            db.session.commit()
+            engine = db.engine
+
+        query_counts = []
+        for per_page in (5, 30):
+            with count_queries(engine) as statements:
+                response = self.client.get(f"/tickets/?per_page={per_page}")
+            self.assertEqual(len(response.get_json()["tickets"]), per_page)
+            self.assertTrue(all(len(t["services"]) == 2 for t in response.get_json()["tickets"]))
+            query_counts.append(len(statements))
+
+        # ETag validator, COUNT, page and one IN query for services
+        self.assertEqual(query_counts, [4, 4])
+
+        with count_queries(engine) as statements:
+            response = self.client.get("/tickets/1")
+        self.assertEqual(len(response.get_json()["services"]), 2)
+        self.assertEqual(len(statements), 2)
+
+    def test_row_serializer_matches_schema_dump(self):
+        with self.app.app_context():
+            brakes = ServiceType(name="Brakes", description=None, price=99.5)
+            db.session.add(brakes)
+            db.session.add(ServiceTicket(service_date=date(2025, 1, 2), customer_id=self.customer_id, car_id=self.car_id,
+                                         VIN="ROWS1", car_issue=None, is_major_damage=True, services=[brakes]))
+            db.session.add(ServiceTicket(service_date=date(2025, 1, 3), customer_id=self.customer_id, car_id=self.car_id,
+                                         VIN="ROWS2", is_major_damage=False))
+            db.session.commit()
+
+            stmt = select(ServiceTicket).order_by(ServiceTicket.id)
+            expected = self.app.json.dumps(service_tickets_schema.dump(db.session.execute(stmt).scalars().all()))
+            actual = self.app.json.dumps(service_ticket_rows.dump(db.session.execute(service_ticket_rows.project(stmt)).all()))
+            self.assertEqual(actual, expected)
+
+    def test_sparse_fieldsets(self):
+        with self.app.app_context():
+            db.session.add(ServiceTicket(service_date=date(2025, 6, 1), customer_id=self.customer_id, car_id=self.car_id,
+                                         VIN="SPARSE1", is_major_damage=False,
+                                         services=[db.session.get(ServiceType, self.service_type_id)]))
+            db.session.commit()
+            engine = db.engine
+
+        with count_queries(engine) as statements:
+            response = self.client.get("/tickets/1?fields=VIN,service_date")
+        self.assertEqual(response.get_json(), {"VIN": "SPARSE1", "service_date": "2025-06-01"})
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn("service_types", statements[1])
+
+        response = self.client.get("/tickets/?fields=id,services")
+        self.assertEqual(set(response.get_json()["tickets"][0]), {"id", "services"})
+
+        response = self.client.get("/service_types/?fields=name")
+        self.assertEqual(set(response.get_json()["service_types"][0]), {"name"})
+
+    def test_conditional_get_on_ticket(self):
+        with self.app.app_context():
+            db.session.add(ServiceTicket(service_date=date(2025, 6, 1), customer_id=self.customer_id, car_id=self.car_id,
+                                         VIN="ETAG1", is_major_damage=False))
+            db.session.add(ServiceType(name="Brakes", description="Pads", price=120))
+            db.session.commit()
+            engine = db.engine
+
+        response = self.client.get("/tickets/1")
+        etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+        with count_queries(engine) as statements:
+            response = self.client.get("/tickets/1", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b"")
+        self.assertEqual(len(statements), 1)
+
+        response = self.client.get("/tickets/1", headers={"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        # Attaching a service only touches the association table, but still has to change the tag
+        self.client.put(f"/service_types/2/assign_service_type/1", headers=self.auth_header)
+        response = self.client.get("/tickets/1", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()["services"]), 1)
+        etag = response.headers["ETag"]
+
+        self.client.put("/service_types/2", json={"name": "Brakes", "description": "Pads and rotors", "price": 150}, headers=self.auth_header)
+        response = self.client.get("/tickets/1", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["services"][0]["price"], 150)
+
+        self.assertNotEqual(self.client.get("/tickets/1?fields=VIN").headers["ETag"], response.headers["ETag"])
+        self.assertNotIn("ETag", self.client.get("/tickets/99").headers)
+
+        response = self.client.get("/tickets/")
+        self.assertEqual(self.client.get("/tickets/", headers={"If-None-Match": response.headers["ETag"]}).status_code, 304)
+
+    def test_seed_command_appends_linked_rows(self):
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["seed", "--customers", "30", "--employees", "3", "--cars", "40",
+                                     "--tickets", "120", "--service-types", "5", "--chunk-size", "25"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("rows/s", result.output)
+
+        with self.app.app_context():
+            count = lambda table: db.session.execute(select(func.count()).select_from(table)).scalar()
+            # Added alongside the rows setUp created
+            self.assertEqual(count(Customer), 31)
+            self.assertEqual(count(Employee), 4)
+            self.assertEqual(count(ServiceType), 5)
+            self.assertEqual(count(ServiceTicket), 120)
+            self.assertGreaterEqual(count(ticket_service), 120)
+            self.assertGreaterEqual(count(mechanic_ticket), 120)
+            mismatched = db.session.execute(
+                select(func.count()).select_from(ServiceTicket).join(Car, Car.id == ServiceTicket.car_id)
+                .where(Car.customer_id != ServiceTicket.customer_id)
+            ).scalar()
+            self.assertEqual(mismatched, 0)
+            self.assertEqual(repair_ticket_totals(dry_run=True), [])
+
+        result = runner.invoke(args=["seed", "--customers", "0", "--cars", "5"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(args=["seed", "--customers", "0", "--employees", "0", "--cars", "0", "--tickets", "10"])
+        self.assertEqual(result.exit_code, 0, result.output)
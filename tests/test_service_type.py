@@ -1,23 +1,16 @@
-import unittest
-from app import create_app
 from app.models import db, Employee, ServiceType, Customer, Car, ServiceTicket
-from werkzeug.security import generate_password_hash
-from app.utils.util import encode_token
+from helpers import AppTestCase, password_hash, make_token
 from datetime import date
 
-class TestServiceType(unittest.TestCase):
+class TestServiceType(AppTestCase):
     def setUp(self):
-        self.app = create_app("TestingConfig")
-        self.client = self.app.test_client()
+        super().setUp()
         
         with self.app.app_context():
-            db.drop_all()
-            db.create_all()
-            
             self.employee = Employee(
                 name = "Admin User",
                 email = "admin@email.com",
-                password = generate_password_hash("adminpass"),
+                password = password_hash("adminpass"),
                 address = "123 Main St",
                 phone = "111-222-3333",
                 role = "mechanic",
@@ -27,7 +20,7 @@ class TestServiceType(unittest.TestCase):
             db.session.add(self.employee)
             db.session.commit()
             
-            self.admin_token = encode_token(user_id=self.employee.id, role="mechanic")
+            self.admin_token = make_token(user_id=self.employee.id, role="mechanic")
             self.auth_header = {
                 "Authorization": f"Bearer {self.admin_token}"
             }
@@ -147,7 +140,7 @@ class TestServiceType(unittest.TestCase):
             customer = Customer(
                 name="Test Customer",
                 email="customer@email.com",
-                password=generate_password_hash("custpass"),
+                password=password_hash("custpass"),
                 address="456 Lane",
                 phone="999-888-7777",
                 role="customer"
@@ -201,7 +194,7 @@ class TestServiceType(unittest.TestCase):
             customer = Customer(
                 name="Test Customer",
                 email="customer@email.com",
-                password=generate_password_hash("custpass"),
+                password=password_hash("custpass"),
                 address="456 Lane",
                 phone="999-888-7777",
                 role="customer"